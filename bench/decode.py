@@ -0,0 +1,71 @@
+"""Time and peak memory of the tshpack series decoding, compared with
+the former decoding path (decompress, unpack, deserialize, localize).
+
+    python bench/decode.py [points ...]
+"""
+import json
+import sys
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from tshistory.util import (
+    nary_unpack,
+    numpy_deserialize
+)
+
+from tshistory_client.api import (
+    decodeseries,
+    encodeseries
+)
+
+
+def legacy_decodeseries(name, bytestream):
+    bmeta, bindex, bvalues = nary_unpack(
+        zlib.decompress(bytestream)
+    )
+    meta = json.loads(bmeta)
+    index, values = numpy_deserialize(bindex, bvalues, meta)
+    series = pd.Series(values, index=index)
+    if meta['tzaware']:
+        series = series.tz_localize('UTC')
+    series.name = name
+    return series
+
+
+def measure(func, payload):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    series = func('bench', payload)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return series, elapsed, peak
+
+
+def main(sizes):
+    print(f'{"points":>10} {"payload":>9} {"decoded":>9} '
+          f'{"legacy":>22} {"current":>22}')
+    for size in sizes:
+        series = pd.Series(
+            np.random.default_rng(42).normal(size=size),
+            index=pd.date_range('2000-1-1', freq='min',
+                                periods=size, tz='UTC')
+        )
+        payload = encodeseries(series)
+        decoded = series.memory_usage(index=True)
+        row = [f'{size:>10} {len(payload) / 1e6:>7.1f}MB {decoded / 1e6:>7.1f}MB']
+        for func in (legacy_decodeseries, decodeseries):
+            out, elapsed, peak = measure(func, payload)
+            assert out.equals(series)
+            row.append(
+                f'{elapsed * 1e3:>8.0f}ms {peak / 1e6:>7.1f}MB ({peak / decoded:.1f}x)'
+            )
+        print(' '.join(row))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 1_000_000, 10_000_000])
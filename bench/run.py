@@ -0,0 +1,433 @@
+"""Benchmark suite of the client against an in-process tshistory_rest
+stand-in (`StandIn`, from test/standin.py).
+
+    python bench/run.py [-k PATTERN] [--quick] [--save NAME]
+                        [--compare NAME] [--threshold 1.25]
+
+Each case is run over a range of parameters (series lengths, revision
+counts, batch sizes) and records its median latency, its throughput
+(points or items per second), its peak traced python memory and the
+size of the request bodies it sends.
+
+The timings include the work of the stand-in server: they are meant
+to be compared with each other and across releases, not taken as
+absolute figures. With `--save`, the results are stored as a baseline
+in bench/baselines/NAME.json; with `--compare`, the run is compared
+with such a baseline and the script fails if any case got slower than
+`--threshold` times its baseline latency.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+import itertools
+import json
+from pathlib import Path
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from tshistory_client.api import (
+    Client,
+    decodeseries,
+    encodeseries
+)
+from tshistory_client.decodepool import DecodePool
+from tshistory_client.util import alignframe
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'test'))
+from standin import StandIn  # noqa: E402
+
+
+BASELINES = Path(__file__).parent / 'baselines'
+CASES = []
+
+
+def case(name, params, quick):
+    """Register a benchmark case.
+
+    The decorated function gets the stand-in server, a client and
+    one parameter; it prepares the data and returns the number of
+    processed units (points or items), a callable running the
+    benchmarked operation and, if any, the clients or pools it made
+    (closed after the run).
+    """
+    def decorator(func):
+        CASES.append((name, func, params, quick))
+        return func
+    return decorator
+
+
+START = pd.Timestamp('2000-1-1', tz='UTC')
+
+
+def genseries(points, start=START, offset=0.):
+    return pd.Series(
+        np.random.default_rng(42).normal(size=points) + offset,
+        index=pd.date_range(start, freq='min', periods=points)
+    )
+
+
+def genhistory(srv, name, revisions, points, every='1D'):
+    # one revision per day (or `every`), each covering the next
+    # `points` minutes
+    for rev in range(revisions):
+        idate = START + rev * pd.Timedelta(every)
+        srv.insert(
+            name,
+            genseries(points, start=idate, offset=rev),
+            insertion_date=idate
+        )
+
+
+def counter():
+    return itertools.count(1).__next__
+
+
+# cases
+
+@case('decodeseries', [10_000, 100_000, 1_000_000], [10_000])
+def bench_decode(srv, client, points):
+    payload = encodeseries(genseries(points))
+    return points, lambda: decodeseries('bench', payload)
+
+
+def bench_decode_batch(pooled):
+    # concurrent decoding of a batch of payloads, as in get_many
+    def bench(srv, client, points):
+        payloads = [encodeseries(genseries(points)) for _ in range(16)]
+        if not pooled:
+            decode = decodeseries
+        else:
+            decodepool = DecodePool(threshold=0)
+            decode = decodepool.series
+
+        def run():
+            with ThreadPoolExecutor(16) as pool:
+                list(pool.map(decode, ['bench'] * 16, payloads))
+        if pooled:
+            return points * 16, run, decodepool
+        return points * 16, run
+    return bench
+
+
+case('decode-batch-threads', [10_000, 100_000, 1_000_000], [10_000])(
+    bench_decode_batch(False)
+)
+case('decode-batch-processes', [10_000, 100_000, 1_000_000], [10_000])(
+    bench_decode_batch(True)
+)
+
+
+@case('get', [10_000, 100_000, 1_000_000], [10_000])
+def bench_get(srv, client, points):
+    srv.insert('bench', genseries(points))
+    return points, lambda: client.get('bench')
+
+
+@case('get-conditional', [10_000, 100_000, 1_000_000], [10_000])
+def bench_get_conditional(srv, client, points):
+    # polling an unchanged series
+    srv.validators = True
+    srv.insert('bench', genseries(points))
+    client = Client(srv.uri, conditional=True)
+    return points, lambda: client.get('bench'), client
+
+
+@case('get-window-30d', [100_000, 1_000_000], [100_000])
+def bench_get_window(srv, client, points):
+    srv.insert('bench', genseries(points))
+    return points, lambda: client.get('bench', window='30D')
+
+
+@case('staircase-revisions', [10, 50], [10])
+def bench_staircase(srv, client, revisions):
+    genhistory(srv, 'bench', revisions, 2880)
+    return revisions * 2880, lambda: client.staircase(
+        'bench', pd.Timedelta(hours=12)
+    )
+
+
+def bench_staircase_many(method):
+    # hourly forecasts over the next 6 hours: the history grows with
+    # the revisions, the staircases with the deltas
+    def bench(srv, client, param):
+        revisions, count = param
+        genhistory(srv, 'bench', revisions, 360, every='1h')
+        deltas = [pd.Timedelta(hours=idx) for idx in range(count)]
+        return revisions * 360 * count, lambda: client.staircase_many(
+            'bench', deltas, method=method
+        )
+    return bench
+
+
+# the revisions grid shows where fetching the history stops paying off
+STAIRCASE_MANY = [
+    (revisions, count)
+    for revisions in (10, 30, 100, 300, 1000)
+    for count in (1, 5)
+]
+case('staircase-many-history', STAIRCASE_MANY, [(10, 5)])(
+    bench_staircase_many('history')
+)
+case('staircase-many-parallel', STAIRCASE_MANY, [(10, 5)])(
+    bench_staircase_many('parallel')
+)
+
+
+@case('history-revisions', [10, 50], [10])
+def bench_history(srv, client, revisions):
+    genhistory(srv, 'bench', revisions, 2880)
+    return revisions * 2880, lambda: client.history('bench')
+
+
+@case('history-columnar', [10, 50], [10])
+def bench_history_columnar(srv, client, revisions):
+    genhistory(srv, 'bench', revisions, 2880)
+    return revisions * 2880, lambda: client.history('bench', columnar=True)
+
+
+@case('history-analytics', [10, 50], [10])
+def bench_history_analytics(srv, client, revisions):
+    genhistory(srv, 'bench', revisions, 2880)
+    hist = client.history('bench', columnar=True)
+
+    def run():
+        hist._sorted = None
+        hist.count()
+        hist.first()
+        hist.last()
+        hist.deltas()
+        hist.asof(START + pd.Timedelta(days=revisions // 2))
+    return revisions * 2880, run
+
+
+def bench_update(upload_format):
+    def bench(srv, client, points):
+        series = genseries(points)
+        client = Client(srv.uri, upload_format=upload_format)
+        count = counter()
+        return points, lambda: client.update(
+            'bench', series + count(), 'bench'
+        ), client
+    return bench
+
+
+case('update', [10_000, 100_000, 1_000_000], [10_000])(
+    bench_update('tshpack')
+)
+case('update-json', [10_000, 100_000, 1_000_000], [10_000])(
+    bench_update('json')
+)
+
+
+@case('replace', [10_000, 100_000], [10_000])
+def bench_replace(srv, client, points):
+    series = genseries(points)
+    count = counter()
+    return points, lambda: client.replace(
+        'bench', series + count(), 'bench'
+    )
+
+
+@case('get-many', [10, 100], [10])
+def bench_get_many(srv, client, batch):
+    srv.latency = .005
+    for idx in range(batch):
+        srv.insert(f'bench-{idx}', genseries(1000))
+    names = [f'bench-{idx}' for idx in range(batch)]
+    return batch, lambda: client.get_many(names)
+
+
+def bench_hot_set(replica):
+    # notebook like reads of a set of series, through a network
+    def bench(srv, client, count):
+        srv.latency = .005
+        names = [f'bench-{idx}' for idx in range(count)]
+        for name in names:
+            genhistory(srv, name, 10, 1000)
+        if replica:
+            client = Client(srv.uri, replica='bench-*')
+
+        def run():
+            for name in names:
+                client.get(name)
+                client.staircase(name, pd.Timedelta(hours=12))
+        return count * 2, run, client
+    return bench
+
+
+case('hot-set-server', [10, 100], [10])(bench_hot_set(False))
+case('hot-set-replica', [10, 100], [10])(bench_hot_set(True))
+
+
+def bench_burst(coalesce):
+    # a burst of identical concurrent reads
+    def bench(srv, client, count):
+        srv.latency = .005
+        srv.insert('bench', genseries(100_000))
+        client = Client(srv.uri, coalesce=coalesce, pool_maxsize=count)
+
+        def run():
+            with ThreadPoolExecutor(count) as pool:
+                for _ in range(count):
+                    pool.submit(client.get, 'bench')
+        return count, run, client
+    return bench
+
+
+case('get-burst', [10, 50], [10])(bench_burst(False))
+case('get-burst-coalesced', [10, 50], [10])(bench_burst(True))
+
+
+def framedata(columns):
+    # staggered indexes, as to make the alignment non trivial
+    return {
+        f'bench-{idx}': genseries(
+            10_000, start=START + pd.Timedelta(minutes=7 * idx)
+        )
+        for idx in range(columns)
+    }
+
+
+@case('frame-align', [10, 100], [10])
+def bench_frame_align(srv, client, columns):
+    data = framedata(columns)
+    return columns * 10_000, lambda: alignframe(data)
+
+
+@case('frame-concat', [10, 100], [10])
+def bench_frame_concat(srv, client, columns):
+    data = framedata(columns)
+    return columns * 10_000, lambda: pd.concat(data, axis=1)
+
+
+@case('get-frame', [10, 100], [10])
+def bench_get_frame(srv, client, columns):
+    for name, series in framedata(columns).items():
+        srv.insert(name, series)
+    names = [f'bench-{idx}' for idx in range(columns)]
+    return columns * 10_000, lambda: client.get_frame(names)
+
+
+@case('update-many', [10, 100], [10])
+def bench_update_many(srv, client, batch):
+    srv.latency = .005
+    series = genseries(1000)
+    count = counter()
+    return batch, lambda: client.update_many(
+        [
+            (f'bench-{idx}', series + count())
+            for idx in range(batch)
+        ],
+        'bench'
+    )
+
+
+@case('catalog', [1_000, 10_000], [1_000])
+def bench_catalog(srv, client, count):
+    series = genseries(10)
+    for idx in range(count):
+        srv.revisions[f'bench-{idx}'] = {START: series}
+    return count, lambda: client.catalog()
+
+
+# runner
+
+def measure(run, repeat):
+    run()  # warm up
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def uploaded(srv, run):
+    # request bytes sent by one run
+    received = srv.received
+    run()
+    return srv.received - received
+
+
+def runall(pattern='*', quick=False, repeat=5):
+    results = {}
+    for name, func, params, quickparams in CASES:
+        if not fnmatch(name, pattern):
+            continue
+        for param in (quickparams if quick else params):
+            with StandIn() as srv, Client(srv.uri) as client:
+                units, run, *resources = func(srv, client, param)
+                try:
+                    latency, peak = measure(run, 1 if quick else repeat)
+                    sent = uploaded(srv, run)
+                finally:
+                    for resource in resources:
+                        resource.close()
+            caseid = f'{name}[{param}]'.replace(' ', '')
+            results[caseid] = {
+                'latency': latency,
+                'throughput': units / latency,
+                'peak': peak,
+                'sent': sent
+            }
+            print(
+                f'{caseid:<32} {latency * 1e3:>10.1f} ms '
+                f'{units / latency:>14,.0f} /s '
+                f'{peak / 1e6:>9.1f} MB '
+                f'{sent / 1e6:>9.2f} MB sent'
+            )
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for caseid, result in results.items():
+        base = baseline.get(caseid)
+        if base is None:
+            continue
+        ratio = result['latency'] / base['latency']
+        flag = ''
+        if ratio > threshold:
+            flag = '  <- regression'
+            regressions.append(caseid)
+        print(f'{caseid:<32} {ratio:>6.2f}x{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-k', default='*', help='case name pattern')
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', help='save the results as a baseline')
+    parser.add_argument('--compare', help='compare with a baseline')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    results = runall(args.k, args.quick, args.repeat)
+    if args.save:
+        BASELINES.mkdir(exist_ok=True)
+        path = BASELINES / f'{args.save}.json'
+        path.write_text(json.dumps(results, indent=2, sort_keys=True))
+        print(f'saved to {path}')
+    if args.compare:
+        baseline = json.loads(
+            (BASELINES / f'{args.compare}.json').read_text()
+        )
+        print(f'\nlatency vs {args.compare}')
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
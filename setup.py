@@ -20,7 +20,11 @@ setup(name='tshistory_client',
           'pandas',
           'pytest_sa_pg',
       ],
+      extras_require={
+          'async': ['httpx']
+      },
       tests_require=[
+          'httpx',
           'responses',
           'tshistory',
           'tshistory_rest'
@@ -86,7 +86,9 @@ class WebTester(webtest.TestApp):
         url = self._remove_fragment(url)
         req = self.RequestClass.blank(url, environ)
 
-        req.environ['wsgi.input'] = io.BytesIO(params.encode('utf-8'))
+        if isinstance(params, str):
+            params = params.encode('utf-8')
+        req.environ['wsgi.input'] = io.BytesIO(params)
         req.content_length = len(params)
         if headers:
             req.headers.update(headers)
@@ -113,8 +115,8 @@ def write_request_bridge(method):
 URI = 'http://test-uri'
 
 @pytest.fixture(scope='session')
-def client(engine):
-    wsgitester = WebTester(
+def wsgitester(engine):
+    return WebTester(
         app.make_app(
             tsapi.timeseries(
                 str(engine.url),
@@ -123,6 +125,43 @@ def client(engine):
             )
         )
     )
+
+
+@pytest.fixture
+def async_transport(wsgitester):
+    # httpx is an optional dependency (the `async` extra)
+    httpx = pytest.importorskip('httpx')
+
+    class AsyncBridgeTransport(httpx.AsyncBaseTransport):
+
+        def __init__(self, wsgitester):
+            self.wsgitester = wsgitester
+
+        async def handle_async_request(self, request):
+            body = await request.aread()
+            method = request.method.lower()
+            if method == 'get':
+                resp = self.wsgitester.get(
+                    str(request.url),
+                    headers=dict(request.headers)
+                )
+            else:
+                resp = getattr(self.wsgitester, method)(
+                    str(request.url),
+                    params=body,
+                    headers=dict(request.headers)
+                )
+            return httpx.Response(
+                resp.status_code,
+                headers=resp.headerlist,
+                content=resp.body
+            )
+
+    return AsyncBridgeTransport(wsgitester)
+
+
+@pytest.fixture(scope='session')
+def client(wsgitester):
     with responses.RequestsMock(assert_all_requests_are_fired=False) as resp:
         resp.add_callback(
             responses.GET, 'http://test-uri/series/state',
@@ -0,0 +1,450 @@
+"""An in-memory stand-in for a tshistory_rest server, for the tests
+and the benchmarks (bench/run.py).
+
+It needs the `responses` package (it intercepts the python-requests
+calls made to its uri).
+"""
+from collections import OrderedDict
+import copy
+from email.parser import BytesParser
+import gzip
+import json
+import threading
+import time
+from urllib.parse import (
+    parse_qs,
+    urlparse
+)
+import zlib
+
+import numpy as np
+import pandas as pd
+import responses
+
+from tshistory.util import (
+    nary_pack,
+    numpy_serialize,
+    pruned_history,
+    tzaware_serie
+)
+
+from tshistory_client.api import (
+    _patch,
+    decodeseries,
+    encodeseries
+)
+
+
+def _packhistory(meta, hist):
+    byteslist = [
+        json.dumps(meta).encode('utf-8'),
+        np.array(
+            [idate.value for idate in hist], dtype='int64'
+        ).tobytes()
+    ]
+    for series in hist.values():
+        byteslist.extend(
+            numpy_serialize(series, meta['value_type'] == 'object')
+        )
+    return zlib.compress(nary_pack(*byteslist))
+
+
+def _diff(old, new):
+    # new and changed points, nans for the erased ones
+    erased = old.index.difference(new.index)
+    previous = old.reindex(new.index)
+    changed = new[previous.isnull().values | (previous != new).values]
+    return pd.concat([
+        changed,
+        pd.Series(np.nan, index=erased, dtype=new.dtype)
+    ]).sort_index()
+
+
+def _form(request):
+    body = request.body or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    ctype = request.headers.get('Content-Type', '')
+    if ctype.startswith('multipart/form-data'):
+        message = BytesParser().parsebytes(
+            f'Content-Type: {ctype}\r\n\r\n'.encode('utf-8') + body
+        )
+        return {
+            part.get_param('name', header='content-disposition'):
+            part.get_payload(decode=True)
+            if part.get_filename()
+            else part.get_payload(decode=True).decode('utf-8')
+            for part in message.get_payload()
+        }
+    return {
+        k: v[0]
+        for k, v in parse_qs(body.decode('utf-8')).items()
+    }
+
+
+def _date(args, key):
+    if args.get(key):
+        date = pd.Timestamp(args[key])
+        if date.tzinfo is None:
+            return date.tz_localize('UTC')
+        return date.tz_convert('UTC')
+
+
+class StandIn:
+    """In-memory stand-in for a tshistory_rest server.
+
+    It serves the series end points (state, staircase, history,
+    metadata and catalog) for the requests made to `uri` while it is
+    used as a context manager. `latency` (in seconds) is added to
+    each request to mimic the network.
+
+    With `gzip`, it accepts gzip compressed request bodies and
+    compresses its json responses for the clients accepting it
+    (otherwise compressed bodies are a bad request).
+
+    With `validators`, the state and staircase answers come with an
+    `ETag` (and a `Last-Modified` date) and the requests matching it
+    (`If-None-Match`) are answered with a 304.
+
+    Failures can be injected with `inject`.
+    """
+
+    def __init__(self, uri='http://standin', latency=0, gzip=False,
+                 validators=False):
+        self.uri = uri
+        self.latency = latency
+        self.gzip = gzip
+        self.validators = validators
+        # name -> {insertion date: series state}
+        self.revisions = {}
+        # name -> user metadata
+        self.meta = {}
+        self.requests = 0
+        # request body bytes, as sent
+        self.received = 0
+        self._faults = []
+        self._diffs = OrderedDict()
+        self._lock = threading.Lock()
+        self._mock = None
+
+    def __enter__(self):
+        self._mock = responses.RequestsMock(
+            assert_all_requests_are_fired=False
+        )
+        self._mock.__enter__()
+        for method, path, handler in (
+                ('GET', '/series/state', self.get_state),
+                ('PATCH', '/series/state', self.patch_state),
+                ('PUT', '/series/state', self.put_state),
+                ('DELETE', '/series/state', self.delete_state),
+                ('GET', '/series/staircase', self.get_staircase),
+                ('GET', '/series/history', self.get_history),
+                ('GET', '/series/metadata', self.get_metadata),
+                ('PUT', '/series/metadata', self.put_metadata),
+                ('GET', '/series/catalog', self.get_catalog)):
+            self._mock.add_callback(
+                method, f'{self.uri}{path}',
+                callback=self._wrap(handler)
+            )
+        return self
+
+    def __exit__(self, *exc):
+        self._mock.__exit__(*exc)
+        self._mock = None
+
+    def inject(self, fault, count=1, method=None, path=None, after=False):
+        """Make the next `count` requests (matching `method` and
+        `path` if given) fail with `fault`, an http status or an
+        exception instance (e.g. a `requests.ConnectionError`),
+        before they are processed or, with `after`, once processed.
+        """
+        self._faults.append({
+            'fault': fault,
+            'count': count,
+            'method': method,
+            'path': path,
+            'after': after
+        })
+
+    def _fault(self, request):
+        for fault in self._faults:
+            if fault['count'] <= 0:
+                continue
+            if fault['method'] and fault['method'] != request.method:
+                continue
+            if fault['path'] and fault['path'] != urlparse(request.url).path:
+                continue
+            fault['count'] -= 1
+            return fault
+
+    def _fail(self, fault):
+        if isinstance(fault['fault'], Exception):
+            raise fault['fault']
+        return (fault['fault'], {}, json.dumps({'message': 'injected'}))
+
+    def _wrap(self, handler):
+        def callback(request):
+            if self.latency:
+                time.sleep(self.latency)
+            args = {
+                k: v[0]
+                for k, v in parse_qs(urlparse(request.url).query).items()
+            }
+            with self._lock:
+                self.requests += 1
+                body = request.body or b''
+                self.received += len(
+                    body.encode('utf-8') if isinstance(body, str) else body
+                )
+                fault = self._fault(request)
+                if fault and not fault['after']:
+                    return self._fail(fault)
+                if request.headers.get('Content-Encoding') == 'gzip':
+                    if not self.gzip:
+                        return (400, {}, json.dumps({
+                            'message': 'unreadable body'
+                        }))
+                    request = copy.copy(request)
+                    request.body = gzip.decompress(request.body)
+                status, headers, body = handler(request, args)
+                if fault:
+                    return self._fail(fault)
+            if (self.gzip and isinstance(body, str) and len(body) > 256 and
+                'gzip' in request.headers.get('Accept-Encoding', '')):
+                body = gzip.compress(body.encode('utf-8'))
+                headers = dict(headers, **{'Content-Encoding': 'gzip'})
+            return status, headers, body
+        return callback
+
+    # helpers
+
+    def state(self, name, revision_date=None):
+        revs = self.revisions.get(name)
+        if revs is None:
+            return None
+        state = None
+        for idate, series in revs.items():
+            if revision_date is not None and idate > revision_date:
+                break
+            state = series
+        return state
+
+    def insert(self, name, series, insertion_date=None, replace=False):
+        series = series.dropna() if replace else series
+        revs = self.revisions.setdefault(name, {})
+        last = self.state(name)
+        if last is not None and not replace:
+            series = _patch(last, series)
+        series = series[series.notnull()]
+        if last is not None and series.equals(last):
+            return False
+        idate = insertion_date or pd.Timestamp.now(tz='UTC')
+        revs[idate] = series.rename(name)
+        return True
+
+    def _diff(self, old, new):
+        # the last diffs are memoized, as a real server stores them
+        # (the states are kept alive along, so that their ids stay
+        # valid)
+        key = (id(old), id(new))
+        if key in self._diffs:
+            self._diffs.move_to_end(key)
+        else:
+            self._diffs[key] = (old, new, _diff(old, new))
+            if len(self._diffs) > 256:
+                self._diffs.popitem(last=False)
+        return self._diffs[key][2]
+
+    def _validated(self, request, name):
+        # the validators of a series and whether the client is up to
+        # date, from its revisions
+        if not self.validators:
+            return {}, False
+        revs = self.revisions[name]
+        last = next(reversed(revs))
+        headers = {
+            'ETag': f'"{len(revs)}-{last.value}"',
+            'Last-Modified': last.strftime('%a, %d %b %Y %H:%M:%S GMT')
+        }
+        known = request.headers.get('If-None-Match')
+        return headers, known == headers['ETag']
+
+    def _notfound(self, name):
+        return (404, {}, json.dumps({
+            'message': f'`{name}` does not exists'
+        }))
+
+    def _packed(self, series, args):
+        fromdate = _date(args, 'from_value_date')
+        todate = _date(args, 'to_value_date')
+        if not tzaware_serie(series):
+            if fromdate is not None:
+                fromdate = fromdate.tz_convert(None)
+            if todate is not None:
+                todate = todate.tz_convert(None)
+        return series.loc[fromdate:todate]
+
+    # end points
+
+    def get_state(self, request, args):
+        name = args['name']
+        if name not in self.revisions:
+            return self._notfound(name)
+        headers, unchanged = self._validated(request, name)
+        if unchanged:
+            return (304, headers, '')
+        state = self.state(name, _date(args, 'insertion_date'))
+        if state is None:
+            # before the first revision
+            first = next(iter(self.revisions[name].values()))
+            state = first.iloc[:0]
+        return (200, headers, encodeseries(self._packed(state, args)))
+
+    def patch_state(self, request, args):
+        form = _form(request)
+        name = form['name']
+        if 'bseries' in form:
+            series = decodeseries(name, form['bseries'])
+        else:
+            values = json.loads(form['series'])
+            index = pd.to_datetime(list(values), utc=True)
+            if form['tzaware'] != 'True':
+                index = index.tz_convert(None)
+            series = pd.Series(
+                list(values.values()), index=index, dtype='float64'
+            )
+        created = name not in self.revisions
+        self.insert(
+            name, series,
+            insertion_date=_date(form, 'insertion_date'),
+            replace=form.get('replace') == 'True'
+        )
+        return (201 if created else 200, {}, json.dumps(name))
+
+    def put_state(self, request, args):
+        form = _form(request)
+        if form['name'] not in self.revisions:
+            return self._notfound(form['name'])
+        self.revisions[form['newname']] = self.revisions.pop(form['name'])
+        self.meta[form['newname']] = self.meta.pop(form['name'], {})
+        return (204, {}, '')
+
+    def delete_state(self, request, args):
+        form = _form(request)
+        if form['name'] not in self.revisions:
+            return self._notfound(form['name'])
+        self.revisions.pop(form['name'])
+        self.meta.pop(form['name'], None)
+        return (204, {}, '')
+
+    def get_staircase(self, request, args):
+        name = args['name']
+        revs = self.revisions.get(name)
+        if revs is None:
+            return self._notfound(name)
+        headers, unchanged = self._validated(request, name)
+        if unchanged:
+            return (304, headers, '')
+        delta = pd.Timedelta(args['delta'])
+        # the value dates in [idate + delta, next idate + delta) come
+        # from the state at idate
+        idates = list(revs)
+        pieces = []
+        for idate, nextdate in zip(idates, idates[1:] + [None]):
+            series = revs[idate]
+            index = series.index
+            if not tzaware_serie(series):
+                index = index.tz_localize('UTC')
+            known = index >= idate + delta
+            if nextdate is not None:
+                known &= index < nextdate + delta
+            pieces.append(series[known])
+        series = pd.concat(pieces).rename(name)
+        return (200, headers, encodeseries(self._packed(series, args)))
+
+    def get_history(self, request, args):
+        name = args['name']
+        revs = self.revisions.get(name)
+        if revs is None:
+            return self._notfound(name)
+        fromdate = _date(args, 'from_insertion_date')
+        todate = _date(args, 'to_insertion_date')
+        diffmode = json.loads(args.get('diffmode', 'false'))
+        keepnans = json.loads(args.get('_keep_nans', 'false'))
+        bounded = bool(
+            args.get('from_value_date') or args.get('to_value_date')
+        )
+        hist = {}
+        previous = None
+        for idate, series in revs.items():
+            if fromdate is not None and idate < fromdate:
+                previous = series
+                continue
+            if todate is not None and idate > todate:
+                break
+            diff = series
+            if previous is not None and (diffmode or bounded):
+                diff = self._diff(previous, series)
+            previous = series
+            if bounded and not len(self._packed(diff, args)):
+                # the revision does not touch the bounds
+                continue
+            current = series
+            if diffmode:
+                current = diff if keepnans else diff.dropna()
+            hist[idate] = self._packed(current, args)
+        if bounded:
+            # the bounds can make successive revisions look alike
+            hist = pruned_history(hist)
+        series = next(iter(revs.values()))
+        return (200, {}, _packhistory(
+            {
+                'tzaware': tzaware_serie(series),
+                'value_type': str(series.dtype),
+                'value_dtype': series.dtype.str
+            },
+            hist
+        ))
+
+    def get_metadata(self, request, args):
+        name = args['name']
+        state = self.state(name)
+        if state is None:
+            return self._notfound(name)
+        if args.get('type') == 'type':
+            return (200, {}, json.dumps('primary'))
+        if args.get('type') == 'interval':
+            if not len(state):
+                return (204, {}, '')
+            return (200, {}, json.dumps([
+                tzaware_serie(state),
+                state.index[0].tz_localize(None).isoformat(),
+                state.index[-1].tz_localize(None).isoformat()
+            ]))
+        meta = dict(self.meta.get(name, {}))
+        if args.get('all') == '1':
+            meta.update({
+                'tzaware': tzaware_serie(state),
+                'index_type': str(state.index.dtype),
+                'index_dtype': state.index.dtype.str,
+                'value_type': str(state.dtype),
+                'value_dtype': state.dtype.str
+            })
+        return (200, {}, json.dumps(meta))
+
+    def put_metadata(self, request, args):
+        form = _form(request)
+        if form['name'] not in self.revisions:
+            return self._notfound(form['name'])
+        self.meta.setdefault(form['name'], {}).update(
+            json.loads(form['metadata'])
+        )
+        return (200, {}, '')
+
+    def get_catalog(self, request, args):
+        return (200, {}, json.dumps({
+            f'{self.uri}!tsh': [
+                [name, 'primary']
+                for name in self.revisions
+            ]
+        }))
@@ -0,0 +1,167 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from tshistory.testutil import (
+    assert_df,
+    genserie,
+    utcdt
+)
+
+httpx = pytest.importorskip('httpx')
+
+from tshistory_client.aio import AsyncClient
+from tshistory_client.api import (
+    ServerError,
+    UnexpectedStatus,
+    encodeseries
+)
+from standin import _packhistory
+
+
+URI = 'http://test-uri'
+
+
+def test_async_base(async_transport):
+
+    async def scenario():
+        async with AsyncClient(URI, transport=async_transport) as client:
+            assert await client.get('no-such-async-series') is None
+            assert not await client.exists('no-such-async-series')
+
+            series = genserie(utcdt(2021, 1, 1), 'D', 3)
+            await client.update(
+                'test-async', series, 'Babar',
+                insertion_date=utcdt(2021, 1, 1)
+            )
+            await client.update(
+                'test-async', series * 2, 'Babar',
+                insertion_date=utcdt(2021, 1, 2)
+            )
+            assert await client.exists('test-async')
+            assert await client.type('test-async') == 'primary'
+
+            # concurrent reads
+            latest, first = await asyncio.gather(
+                client.get('test-async'),
+                client.get('test-async', revision_date=utcdt(2021, 1, 1))
+            )
+            assert_df("""
+2021-01-01 00:00:00+00:00    0.0
+2021-01-02 00:00:00+00:00    2.0
+2021-01-03 00:00:00+00:00    4.0
+""", latest)
+            assert_df("""
+2021-01-01 00:00:00+00:00    0.0
+2021-01-02 00:00:00+00:00    1.0
+2021-01-03 00:00:00+00:00    2.0
+""", first)
+
+            hist = await client.history('test-async')
+            assert len(hist) == 2
+            assert all(
+                s.name == 'test-async'
+                for s in hist.values()
+            )
+
+            ival = await client.interval('test-async')
+            assert ival.left == pd.Timestamp('2021-01-01', tz='UTC')
+
+            await client.update_metadata('test-async', {'desc': 'async'})
+            assert await client.metadata('test-async') == {'desc': 'async'}
+
+            cat = await client.catalog()
+            assert ['test-async', 'primary'] in cat[
+                ('db://localhost:5433/postgres', 'tsh')
+            ]
+
+            await client.rename('test-async', 'test-async-2')
+            assert not await client.exists('test-async')
+            await client.delete('test-async-2')
+            assert not await client.exists('test-async-2')
+
+            with pytest.raises(SyntaxError):
+                await client.register_formula('async-formula', '(+ 3')
+
+    asyncio.run(scenario())
+
+
+def test_async_status_errors():
+    statuses = {
+        '/series/state': 503,
+        '/series/catalog': 400,
+        '/series/metadata': 404
+    }
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(
+            statuses[request.url.path],
+            json={'message': 'nope'}
+        )
+    )
+
+    async def scenario():
+        async with AsyncClient(URI, transport=transport) as client:
+            with pytest.raises(ServerError) as err:
+                await client.get('test-async')
+            assert err.value.status == 503
+            with pytest.raises(UnexpectedStatus):
+                await client.catalog()
+            with pytest.raises(UnexpectedStatus):
+                await client.update_metadata('test-async', {'a': 1})
+            with pytest.raises(ServerError):
+                await client.delete('test-async')
+
+    asyncio.run(scenario())
+
+
+def test_async_upload_fallback():
+    # a bad request in both formats, then a server refusing tshpack
+    statuses = [400, 400, 415, 201]
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(statuses.pop(0), json='test-async')
+    )
+
+    async def scenario():
+        async with AsyncClient(URI, transport=transport) as client:
+            series = genserie(utcdt(2021, 1, 1), 'D', 3)
+            with pytest.raises(UnexpectedStatus):
+                await client.update('test-async', series, 'Babar')
+            assert client.upload_format == 'tshpack'
+            await client.update('test-async', series, 'Babar')
+            assert client.upload_format == 'json'
+
+    asyncio.run(scenario())
+
+
+def test_async_decode_threshold():
+    series = genserie(utcdt(2021, 1, 1), 'H', 10000)
+    hist = {utcdt(2021, 1, 1): series}
+    meta = {
+        'tzaware': True,
+        'value_type': 'float64',
+        'value_dtype': '<f8'
+    }
+    bodies = {
+        '/series/state': encodeseries(series),
+        '/series/history': _packhistory(meta, hist)
+    }
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(
+            200, content=bodies[request.url.path]
+        )
+    )
+
+    async def scenario(threshold):
+        async with AsyncClient(URI,
+                               transport=transport,
+                               decode_threshold=threshold) as client:
+            # executor or not, the same series
+            got = await client.get('test-async')
+            assert got.equals(series) and got.name == 'test-async'
+            got = await client.history('test-async')
+            assert list(got) == list(hist)
+            assert got[utcdt(2021, 1, 1)].equals(series)
+
+    asyncio.run(scenario(0))
+    asyncio.run(scenario(1 << 30))
@@ -1,5 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import threading
+
 import pandas as pd
 import pytest
+import requests
 
 from tshistory import tsio
 from tshistory.testutil import (
@@ -9,6 +14,16 @@ from tshistory.testutil import (
     utcdt
 )
 
+from tshistory_client.api import (
+    Client,
+    ServerError,
+    UnexpectedStatus,
+    decodeseries,
+    encodeseries
+)
+from tshistory_client.retry import RetryPolicy
+from standin import StandIn
+
 
 def test_naive(client, engine, tsh):
     series_in = genserie(pd.Timestamp('2018-1-1'), 'H', 3)
@@ -41,6 +56,8 @@ def test_base(client, engine, tsh):
     series_in = genserie(utcdt(2018, 1, 1), 'H', 3)
     client.update('test', series_in, 'Babar',
                   insertion_date=utcdt(2019, 1, 1))
+    # the binary upload was accepted (no fallback to json)
+    assert client.upload_format == 'tshpack'
     assert client.exists('test')
 
     # now let's get it back
@@ -366,3 +383,835 @@ def test_multisources(client, engine):
     cat = client.catalog(allsources=False)
     assert ('db://localhost:5433/postgres', 'tsh') in cat
     assert ('db://localhost:5433/postgres', 'other') not in cat
+
+
+def test_transport(client):
+    with Client(client.uri, timeout=(3, 30), pool_maxsize=4) as c:
+        assert c.get('no-such-series') is None
+        assert not c.exists('no-such-series')
+        adapter = c.session.get_adapter(c.uri)
+        assert adapter._pool_maxsize == 4
+
+
+def test_encode_decode():
+    for series in (
+            genserie(utcdt(2020, 1, 1), 'H', 3),
+            genserie(pd.Timestamp('2020-1-1'), 'H', 3),
+            pd.Series(
+                ['a', None, 'c'],
+                index=pd.date_range('2020-1-1', periods=3)
+            )):
+        decoded = decodeseries('roundtrip', encodeseries(series))
+        assert decoded.name == 'roundtrip'
+        assert decoded.index.equals(series.index)
+        assert decoded.values.tolist() == series.values.tolist()
+
+
+def test_json_upload(client):
+    c = Client(client.uri, upload_format='json')
+    series = genserie(utcdt(2020, 1, 1), 'D', 3)
+    c.update('test-json-upload', series, 'Babar')
+    c.replace('test-json-upload', series * 2, 'Babar')
+    assert_df("""
+2020-01-01 00:00:00+00:00    0.0
+2020-01-02 00:00:00+00:00    2.0
+2020-01-03 00:00:00+00:00    4.0
+""", client.get('test-json-upload'))
+
+
+def test_get_many(client):
+    series = genserie(utcdt(2020, 1, 1), 'D', 3)
+    client.update('test-many-1', series, 'Babar')
+    client.update('test-many-2', series * 2, 'Babar')
+
+    c = Client(client.uri, pool_maxsize=2)
+    res = c.get_many(['test-many-1', 'test-many-2', 'no-such-series'])
+    assert res['no-such-series'] is None
+    assert not res.errors
+    assert_df("""
+                           test-many-1  test-many-2
+2020-01-01 00:00:00+00:00          0.0          0.0
+2020-01-02 00:00:00+00:00          1.0          2.0
+2020-01-03 00:00:00+00:00          2.0          4.0
+""", res.frame())
+
+    def get(name, **kw):
+        if name == 'test-many-2':
+            raise ValueError('boom')
+        return Client.get(c, name, **kw)
+
+    c.get = get
+    res = c.get_many(
+        ['test-many-1', 'test-many-2'],
+        from_value_date=utcdt(2020, 1, 2)
+    )
+    assert list(res) == ['test-many-1']
+    assert len(res['test-many-1']) == 2
+    assert str(res.errors['test-many-2']) == 'boom'
+
+
+def test_update_many(client):
+    series = genserie(utcdt(2020, 1, 1), 'D', 3)
+    res = client.update_many([
+        ('test-bulk-1', series, {'event': 'bulk'}),
+        ('test-bulk-2', series),
+        ('test-bulk-1', series * 2),
+        ('test-other', series),
+        ('test-bulk-3', series),
+        ('test-bulk-3', None),
+        ('test-bulk-3', series * 3)
+    ], 'Babar')
+    assert res == {'test-bulk-1': 2, 'test-bulk-2': 1}
+    assert str(res.errors['test-other']) == (
+        'not allowed to update to a secondary source'
+    )
+    assert res.errors['test-other'].written == 0
+    # the second write failed, the third one was not attempted
+    assert res.errors['test-bulk-3'].written == 1
+    assert len(client.history('test-bulk-3')) == 1
+    assert res.throughput > 0
+
+    assert_df("""
+2020-01-01 00:00:00+00:00    0.0
+2020-01-02 00:00:00+00:00    2.0
+2020-01-03 00:00:00+00:00    4.0
+""", client.get('test-bulk-1'))
+    assert len(client.history('test-bulk-1')) == 2
+
+    res = client.replace_many([
+        ('test-bulk-1', series[:1]),
+        ('test-bulk-2', series[1:])
+    ], 'Babar')
+    assert res == {'test-bulk-1': 1, 'test-bulk-2': 1}
+    assert len(client.get('test-bulk-1')) == 1
+    assert len(client.get('test-bulk-2')) == 2
+
+
+def test_cache(client):
+    c = Client(client.uri, cache_size=1e6)
+    for day in (1, 2):
+        c.update(
+            'test-cache',
+            genserie(utcdt(2020, 1, day), 'D', 3),
+            'Babar',
+            insertion_date=utcdt(2021, 1, day)
+        )
+
+    first = c.get('test-cache', revision_date=utcdt(2021, 1, 1))
+    assert len(first) == 3
+    first.iloc[0] = 42  # does not touch the cache
+    again = c.get('test-cache', revision_date=utcdt(2021, 1, 1))
+    assert again.iloc[0] == 0
+    assert c.cache.stats()['hits'] == 1
+
+    # latest states are not cached (nor looked up) without ttl
+    misses = c.cache.stats()['misses']
+    c.get('test-cache')
+    c.get('test-cache')
+    assert c.cache.stats()['hits'] == 1
+    assert c.cache.stats()['misses'] == misses
+    assert len(c.cache) == 1
+
+    # writes invalidate
+    c.update(
+        'test-cache',
+        genserie(utcdt(2020, 1, 3), 'D', 3),
+        'Babar',
+        insertion_date=utcdt(2021, 1, 3)
+    )
+    assert len(c.cache) == 0
+
+    c = Client(client.uri, cache_size=1e6, cache_ttl=60)
+    assert len(c.get('test-cache')) == 5
+    assert len(c.get('test-cache')) == 5
+    assert c.cache.stats()['hits'] == 1
+
+
+def test_diskcache(client, tmp_path):
+    c = Client(client.uri, cache_dir=tmp_path)
+    for day in (1, 2):
+        c.update(
+            'test-diskcache',
+            genserie(utcdt(2020, 1, day), 'D', 3),
+            'Babar',
+            insertion_date=utcdt(2021, 1, day)
+        )
+
+    first = c.get('test-diskcache', revision_date=utcdt(2021, 1, 1))
+    assert first.values.flags.writeable
+    hist = c.history('test-diskcache', to_insertion_date=utcdt(2021, 1, 2))
+    assert len(hist) == 2
+    # latest states are not stored
+    c.get('test-diskcache')
+    c.history('test-diskcache')
+    assert len(list(c.diskcache._entries())) == 2
+
+    # another client (or process) gets them from the disk
+    other = Client(client.uri, cache_dir=tmp_path)
+    cached = other.get('test-diskcache', revision_date=utcdt(2021, 1, 1))
+    assert cached.equals(first)
+    # as writable as the first one
+    cached.iloc[0] = 42
+    assert other.get(
+        'test-diskcache', revision_date=utcdt(2021, 1, 1)
+    ).equals(first)
+    cachedhist = other.history(
+        'test-diskcache', to_insertion_date=utcdt(2021, 1, 2)
+    )
+    assert list(cachedhist) == list(hist)
+    for idate, series in hist.items():
+        assert cachedhist[idate].equals(series)
+
+    other.delete('test-diskcache')
+    assert other.diskcache.size() == 0
+
+
+def test_sync(client):
+    assert client.sync('no-such-series') is None
+
+    client.update(
+        'test-sync',
+        genserie(utcdt(2020, 1, 1), 'D', 3),
+        'Babar'
+    )
+    series = client.sync('test-sync')
+    assert_df("""
+2020-01-01 00:00:00+00:00    0.0
+2020-01-02 00:00:00+00:00    1.0
+2020-01-03 00:00:00+00:00    2.0
+""", series)
+
+    # nothing new
+    assert client.sync('test-sync').equals(series)
+
+    # new point, changed point, erased point
+    client.update(
+        'test-sync',
+        pd.Series(
+            [float('nan'), 10., 3.],
+            index=[utcdt(2020, 1, 1), utcdt(2020, 1, 2), utcdt(2020, 1, 4)]
+        ),
+        'Babar'
+    )
+    series = client.sync('test-sync')
+    assert_df("""
+2020-01-02 00:00:00+00:00    10.0
+2020-01-03 00:00:00+00:00     2.0
+2020-01-04 00:00:00+00:00     3.0
+""", series)
+    assert series.equals(client.get('test-sync'))
+
+    client.delete('test-sync')
+    assert client.sync('test-sync') is None
+
+
+def test_sync_cache(client):
+    c = Client(client.uri, cache_size=1e6, cache_ttl=3600)
+    c.update(
+        'test-sync-cache',
+        genserie(utcdt(2020, 1, 1), 'D', 3),
+        'Babar'
+    )
+    assert c.get('test-sync-cache').tolist() == [0, 1, 2]
+
+    # written by someone else: the cached state is outdated
+    client.update(
+        'test-sync-cache',
+        genserie(utcdt(2020, 1, 1), 'D', 3) + 11,
+        'Babar'
+    )
+    assert c.get('test-sync-cache').tolist() == [0, 1, 2]
+    assert c.sync('test-sync-cache').tolist() == [11, 12, 13]
+    assert c.sync('test-sync-cache').tolist() == [11, 12, 13]
+
+
+def test_iter_history(client):
+    hist = client.history('staircase', from_value_date=utcdt(2015, 1, 2))
+    streamed = list(
+        client.iter_history(
+            'staircase',
+            from_value_date=utcdt(2015, 1, 2),
+            chunksize=10
+        )
+    )
+    assert [idate for idate, _ in streamed] == list(hist)
+    for idate, series in streamed:
+        assert series.name == 'staircase'
+        assert series.equals(hist[idate])
+
+    assert list(client.iter_history('no-such-series')) == []
+
+    # the max over all revisions
+    assert client.fold_history(
+        'staircase',
+        lambda agg, idate, series: max(agg, series.max()),
+        initial=0
+    ) == 6
+
+
+def test_window(client):
+    series = genserie(utcdt(2020, 1, 1), 'H', 24 * 10)
+    client.update('test-window', series, 'Babar')
+
+    full = client.get('test-window')
+    assert client.get('test-window', window='1D').equals(full)
+    assert client.get('test-window', window=pd.Timedelta(hours=7)).equals(full)
+    assert client.get('test-window', window='30D').equals(full)
+
+    part = client.get(
+        'test-window',
+        from_value_date=utcdt(2020, 1, 2, 12),
+        to_value_date=utcdt(2020, 1, 5),
+        window='1D'
+    )
+    assert part.equals(
+        full[utcdt(2020, 1, 2, 12):utcdt(2020, 1, 5)]
+    )
+    assert part.name == 'test-window'
+
+    assert client.get('no-such-series', window='1D') is None
+
+    # the interval of a narrowed latest state does not bound the
+    # past revisions
+    client.update(
+        'test-window-narrowed',
+        genserie(utcdt(2020, 1, 1), 'D', 10),
+        'Babar',
+        insertion_date=utcdt(2021, 1, 1)
+    )
+    client.replace(
+        'test-window-narrowed',
+        genserie(utcdt(2020, 1, 3), 'D', 6),
+        'Babar',
+        insertion_date=utcdt(2021, 1, 2)
+    )
+    past = client.get(
+        'test-window-narrowed', revision_date=utcdt(2021, 1, 1)
+    )
+    assert len(past) == 10
+    assert client.get(
+        'test-window-narrowed',
+        revision_date=utcdt(2021, 1, 1),
+        window='1D'
+    ).equals(past)
+    assert len(client.get('test-window-narrowed', window='1D')) == 6
+    stair = client.staircase('test-window-narrowed', pd.Timedelta(0))
+    assert client.staircase(
+        'test-window-narrowed', pd.Timedelta(0), window='1D'
+    ).equals(stair)
+
+    stair = client.staircase(
+        'staircase',
+        pd.Timedelta(hours=3),
+        window='6H'
+    )
+    assert stair.equals(
+        client.staircase('staircase', pd.Timedelta(hours=3))
+    )
+
+
+def test_stream(client):
+    c = Client(client.uri, stream=True)
+    assert c.get('no-such-series') is None
+    assert c.get('test-window').equals(client.get('test-window'))
+    assert c.get(
+        'test-window',
+        from_value_date=utcdt(2020, 1, 3)
+    ).equals(
+        client.get('test-window', from_value_date=utcdt(2020, 1, 3))
+    )
+    assert c.staircase(
+        'staircase', pd.Timedelta(hours=3)
+    ).equals(
+        client.staircase('staircase', pd.Timedelta(hours=3))
+    )
+
+
+def test_instrumentation(client):
+    events = []
+    c = Client(client.uri, metrics=True)
+    c.add_listener(events.append)
+
+    series = genserie(utcdt(2020, 1, 1), 'H', 24)
+    c.update('test-instrumentation', series, 'Babar')
+    c.get('test-instrumentation')
+    assert c.get('no-such-series') is None
+    assert len(c.history('test-instrumentation')) == 1
+
+    assert [
+        (e['method'], e['endpoint'], e['name'], e['status'])
+        for e in events
+    ] == [
+        ('PATCH', '/series/state', 'test-instrumentation', 201),
+        ('GET', '/series/state', 'test-instrumentation', 200),
+        ('GET', '/series/state', 'no-such-series', 404),
+        ('GET', '/series/history', 'test-instrumentation', 200)
+    ]
+    patch, get = events[:2]
+    assert patch['sent'] > 0
+    assert get['sent'] == 0
+    assert get['received'] > 0
+    assert get['http_time'] > 0
+    assert get['decode_time'] > 0
+
+    stats = c.metrics.stats()
+    assert sorted(stats) == [
+        'GET /series/history',
+        'GET /series/state',
+        'PATCH /series/state'
+    ]
+    state = stats['GET /series/state']
+    assert state['requests'] == 2
+    assert state['errors'] == 0
+    assert sum(state['histogram'].values()) == 2
+    assert c.metrics.quantile('GET /series/state', .5) > 0
+
+    # streamed responses are accounted when consumed
+    c.stream = True
+    c.get('test-instrumentation')
+    assert events[-1]['received'] == get['received']
+    list(c.iter_history('test-instrumentation'))
+    assert events[-1]['endpoint'] == '/series/history'
+    assert events[-1]['received'] > 0
+
+    c.remove_listener(events.append)
+    c.get('test-instrumentation')
+    assert len(events) == 6
+    assert c.metrics.stats()['GET /series/state']['requests'] == 4
+
+
+def test_get_frame(client):
+    client.update(
+        'test-frame-1', genserie(utcdt(2020, 1, 1), 'D', 3), 'Babar'
+    )
+    client.update(
+        'test-frame-2', genserie(utcdt(2020, 1, 2), 'D', 3) * 2, 'Babar'
+    )
+    client.update(
+        'test-frame-naive',
+        genserie(pd.Timestamp('2020-1-1'), 'D', 3),
+        'Babar'
+    )
+
+    frame = client.get_frame(
+        ['test-frame-2', 'test-frame-1', 'no-such-series']
+    )
+    assert_df("""
+                           test-frame-2  test-frame-1
+2020-01-01 00:00:00+00:00           NaN           0.0
+2020-01-02 00:00:00+00:00           0.0           1.0
+2020-01-03 00:00:00+00:00           2.0           2.0
+2020-01-04 00:00:00+00:00           4.0           NaN
+""", frame)
+
+    frame = client.get_frame(
+        ['test-frame-1', 'test-frame-2'],
+        from_value_date=utcdt(2020, 1, 3)
+    )
+    assert len(frame) == 2
+
+    with pytest.raises(ValueError):
+        client.get_frame(['test-frame-1', 'test-frame-naive'])
+
+
+def test_catalog_cache(client):
+    def normalized(cat):
+        return {
+            source: sorted(map(tuple, items))
+            for source, items in cat.items()
+        }
+
+    c = Client(client.uri, catalog_ttl=3600)
+    assert normalized(c.catalog()) == normalized(client.catalog())
+    assert c.exists('test-other')
+    assert not c.exists('test-catalog')
+
+    series = genserie(utcdt(2020, 1, 1), 'D', 3)
+    c.update('test-catalog', series, 'Babar')
+    main = ('db://localhost:5433/postgres', 'tsh')
+    assert c.catalog_index().lookup('test-catalog') == (main, 'primary')
+    assert c.exists('test-catalog')
+
+    c.rename('test-catalog', 'test-catalog-renamed')
+    assert not c.exists('test-catalog')
+    assert c.catalog_index().search('test-catalog') == [
+        'test-catalog-renamed'
+    ]
+    # the local amendments match the server
+    assert normalized(c.catalog()) == normalized(client.catalog())
+
+    c.delete('test-catalog-renamed')
+    assert not c.exists('test-catalog-renamed')
+    assert normalized(c.catalog()) == normalized(client.catalog())
+
+    # writes from elsewhere show up on refresh
+    client.update('test-catalog-other-writer', series, 'Babar')
+    assert not c.exists('test-catalog-other-writer')
+    assert 'test-catalog-other-writer' in c.catalog_index(refresh=True)
+    client.delete('test-catalog-other-writer')
+
+
+def test_lookups_many(client):
+    series = genserie(utcdt(2020, 1, 1), 'D', 3)
+    client.update('test-lookups', series, 'Babar')
+    client.update_metadata('test-lookups', {'unit': 'MW'})
+    names = ['test-lookups', 'no-such-series', 'test-lookups']
+
+    res = client.exists_many(names)
+    assert res == {
+        'test-lookups': True,
+        'no-such-series': False
+    }
+    assert not res.errors
+
+    c = Client(client.uri, catalog_ttl=3600)
+    assert c.exists_many(names) == res
+
+    res = client.metadata_many(names)
+    assert res['test-lookups'] == {'unit': 'MW'}
+    assert 'message' in res['no-such-series']
+
+    res = client.interval_many(names)
+    assert res == {
+        'test-lookups': pd.Interval(
+            utcdt(2020, 1, 1), utcdt(2020, 1, 3), closed='both'
+        )
+    }
+    assert isinstance(res.errors['no-such-series'], ValueError)
+
+
+def test_compression():
+    series = genserie(utcdt(2020, 1, 1), 'H', 1000)
+    with StandIn(gzip=True) as srv:
+        c = Client(
+            srv.uri,
+            metrics=True,
+            compress_threshold=1000,
+            upload_format='json'
+        )
+        c.update('test-gzip', series, 'Babar')
+        c.update_metadata('test-gzip', {'comment': 'x' * 10})
+        c.update_metadata('test-gzip', {'description': 'y' * 2000})
+        assert c.metadata('test-gzip')['comment'] == 'x' * 10
+        assert c.get('test-gzip').equals(series.rename('test-gzip'))
+
+        stats = c.metrics.stats()
+        assert stats['PATCH /series/state']['sent_ratio'] > 5
+        # the small body went as is, the large one compressed
+        assert (
+            stats['PUT /series/metadata']['sent_uncompressed'] -
+            stats['PUT /series/metadata']['sent']
+        ) > 1000
+        assert stats['GET /series/metadata']['received_ratio'] > 5
+        assert c.compress_threshold == 1000
+
+    # a server not decoding the compressed bodies
+    with StandIn() as srv:
+        c = Client(srv.uri, compress_threshold=1000, upload_format='json')
+        c.update('test-gzip', series, 'Babar')
+        assert c.compress_threshold is None
+        assert srv.requests == 2
+        assert c.get('test-gzip').equals(series.rename('test-gzip'))
+
+
+def test_retry():
+    series = genserie(utcdt(2020, 1, 1), 'H', 10)
+    with StandIn() as srv:
+        c = Client(srv.uri, retry=RetryPolicy(backoff=.001))
+        c.update('test-retry', series, 'Babar')
+
+        # reads
+        srv.inject(503, count=2, method='GET')
+        assert c.get('test-retry').equals(series.rename('test-retry'))
+        srv.inject(requests.ConnectionError('reset'), method='GET')
+        assert c.get('test-retry').equals(series.rename('test-retry'))
+        srv.inject(502, count=4, method='GET')
+        with pytest.raises(ServerError) as err:
+            c.get('test-retry')
+        assert err.value.status == 502
+        # former behaviour
+        assert isinstance(err.value, AssertionError)
+
+        # a processed write is not replayed
+        srv.inject(500, method='PATCH', after=True)
+        with pytest.raises(ServerError):
+            c.update('test-retry', series + 1, 'Babar')
+        srv.inject(
+            requests.ConnectionError('reset'), method='PATCH', after=True
+        )
+        with pytest.raises(requests.ConnectionError):
+            c.update('test-retry', series + 2, 'Babar')
+        assert len(srv.revisions['test-retry']) == 3
+
+        # a refused one is
+        srv.inject(503, method='PATCH')
+        c.update('test-retry', series + 3, 'Babar')
+        assert len(srv.revisions['test-retry']) == 4
+
+        assert c.retry.stats() == {
+            'requests': 7,
+            'retries': 7,
+            'budget_exhausted': 0,
+            'endpoints': {
+                'GET /series/state': 6,
+                'PATCH /series/state': 1
+            }
+        }
+
+        # without retries
+        c = Client(srv.uri)
+        srv.inject(503, method='GET')
+        with pytest.raises(ServerError):
+            c.get('test-retry')
+        srv.inject(400, method='GET')
+        with pytest.raises(UnexpectedStatus):
+            c.catalog()
+
+        # a bad write does not make the client give up binary uploads
+        srv.inject(400, count=2, method='PATCH')
+        with pytest.raises(UnexpectedStatus):
+            c.update('test-retry', series + 4, 'Babar')
+        assert c.upload_format == 'tshpack'
+        # a server refusing them does
+        srv.inject(415, method='PATCH')
+        c.update('test-retry', series + 5, 'Babar')
+        assert c.upload_format == 'json'
+
+        # failed metadata writes are not swallowed
+        srv.inject(500, method='PUT')
+        with pytest.raises(ServerError):
+            c.update_metadata('test-retry', {'unit': 'MW'})
+        with pytest.raises(UnexpectedStatus) as err:
+            c.update_metadata('no-such-series', {'unit': 'MW'})
+        assert err.value.status == 404
+
+
+def test_staircase_many(client):
+    deltas = [
+        pd.Timedelta(hours=1),
+        pd.Timedelta(hours=3),
+        pd.Timedelta(hours=30)
+    ]
+    for name in ('staircase', 'staircase-naive'):
+        for method in ('history', 'parallel'):
+            stairs = client.staircase_many(name, deltas, method=method)
+            assert list(stairs) == deltas
+            for delta in deltas:
+                assert stairs[delta].equals(client.staircase(name, delta))
+
+        stairs = client.staircase_many(
+            name, deltas,
+            from_value_date=pd.Timestamp('2015-1-2 4:00'),
+            to_value_date=pd.Timestamp('2015-1-3 5:00'),
+            method='history'
+        )
+        for delta in deltas:
+            assert stairs[delta].equals(
+                client.staircase(
+                    name, delta,
+                    from_value_date=pd.Timestamp('2015-1-2 4:00'),
+                    to_value_date=pd.Timestamp('2015-1-3 5:00')
+                )
+            )
+
+    assert client.staircase_many('no-such-series', deltas) is None
+    assert client.staircase_many(
+        'no-such-series', deltas, method='history'
+    ) is None
+
+
+def test_history_columnar(client):
+    for name in ('staircase', 'staircase-naive'):
+        hist = client.history(name, columnar=True)
+        assert len(hist) == 4
+        assert hist.name == name
+        revisions = client.history(name)
+        assert list(hist.insertion_dates) == list(revisions)
+        for idate, series in hist.to_dict().items():
+            assert series.equals(revisions[idate])
+        for idate, series in hist.to_dict(diffmode=True).items():
+            assert series.equals(client.history(name, diffmode=True)[idate])
+
+        assert hist.asof().equals(client.get(name))
+        assert hist.asof(utcdt(2015, 1, 2, 12)).equals(
+            client.get(name, revision_date=utcdt(2015, 1, 2, 12))
+        )
+        assert hist.staircase(pd.Timedelta(hours=3)).equals(
+            client.staircase(name, pd.Timedelta(hours=3))
+        )
+        # the revisions do not overlap
+        assert (hist.count() == 1).all()
+        assert hist.deltas().empty
+        assert hist.first().equals(hist.last())
+
+        diffs = client.history(name, columnar=True, diffmode=True)
+        assert diffs.asof().equals(hist.asof())
+
+    assert client.history('no-such-series', columnar=True) is None
+
+
+def test_replica(client):
+    replica = Client(client.uri, replica='staircase*')
+    for name in ('staircase', 'staircase-naive'):
+        assert replica.get(name).equals(client.get(name))
+        assert replica.get(
+            name, revision_date=utcdt(2015, 1, 2, 12)
+        ).equals(
+            client.get(name, revision_date=utcdt(2015, 1, 2, 12))
+        )
+        assert replica.staircase(name, pd.Timedelta(hours=3)).equals(
+            client.staircase(name, pd.Timedelta(hours=3))
+        )
+        hist = replica.history(name, diffmode=True)
+        expected = client.history(name, diffmode=True)
+        assert list(hist) == list(expected)
+        for idate, series in hist.items():
+            assert series.equals(expected[idate])
+
+    stats = replica.replica.stats()
+    assert stats['loads'] == 2
+    assert stats['reads'] == 8
+
+
+def test_coalescing():
+    series = genserie(utcdt(2020, 1, 1), 'H', 10)
+    with StandIn() as srv:
+        c = Client(srv.uri, coalesce=True)
+        c.update('test-coalesce', series, 'Babar')
+        srv.latency = .2
+
+        def concurrently(func, count=8):
+            barrier = threading.Barrier(count)
+
+            def call():
+                barrier.wait()
+                return func()
+
+            requests = srv.requests
+            with ThreadPoolExecutor(count) as pool:
+                futures = [pool.submit(call) for _ in range(count)]
+            return srv.requests - requests, [f.result() for f in futures]
+
+        sent, results = concurrently(lambda: c.get('test-coalesce'))
+        assert sent == 1
+        assert all(
+            res.equals(series.rename('test-coalesce'))
+            for res in results
+        )
+        # not shared
+        results[0].iloc[0] = 42
+        assert results[1].iloc[0] == 0
+
+        for read in (
+                lambda: c.staircase('test-coalesce', pd.Timedelta(hours=1)),
+                lambda: c.history('test-coalesce'),
+                lambda: c.history('test-coalesce', columnar=True),
+                lambda: c.metadata('test-coalesce', all=True),
+                lambda: c.catalog()):
+            sent, results = concurrently(read)
+            assert sent == 1
+
+        # different reads are not coalesced
+        hours = itertools.count()
+        sent, _ = concurrently(
+            lambda: c.get(
+                'test-coalesce',
+                from_value_date=utcdt(2020, 1, 1, next(hours))
+            ),
+            count=2
+        )
+        assert sent == 2
+
+        # nor are successive ones
+        c.get('test-coalesce')
+        c.get('test-coalesce')
+        assert c.coalescer.stats() == {
+            'calls': 10,
+            'coalesced': 42,
+            'in_flight': 0
+        }
+
+        # failures are shared
+        srv.inject(503, method='GET')
+        sent, _ = concurrently(
+            lambda: pytest.raises(ServerError, c.get, 'test-coalesce')
+        )
+        assert sent == 1
+
+
+def test_conditional():
+    series = genserie(utcdt(2020, 1, 1), 'H', 10)
+    with StandIn(validators=True) as srv:
+        c = Client(srv.uri, conditional=True, metrics=True)
+        c.update('test-conditional', series, 'Babar')
+
+        first = c.get('test-conditional')
+        first.iloc[0] = 42  # does not touch the held series
+        again = c.get('test-conditional')
+        assert again.equals(series.rename('test-conditional'))
+        assert c.validators.stats() == {
+            'entries': 1,
+            'revalidated': 1,
+            'modified': 1
+        }
+        stats = c.metrics.stats()['GET /series/state']
+        assert stats['requests'] == 2
+
+        # changes are seen, whoever makes them
+        c.update('test-conditional', series + 1, 'Babar')
+        assert c.get('test-conditional').iloc[0] == 1
+        Client(srv.uri).update('test-conditional', series + 2, 'Babar')
+        assert c.get('test-conditional').iloc[0] == 2
+        assert c.get('test-conditional').iloc[0] == 2
+
+        stair = c.staircase('test-conditional', pd.Timedelta(hours=1))
+        assert c.staircase(
+            'test-conditional', pd.Timedelta(hours=1)
+        ).equals(stair)
+        assert c.validators.stats()['revalidated'] == 3
+
+        # past revisions are not revalidated
+        c.get('test-conditional', revision_date=utcdt(2100, 1, 1))
+        assert len(c.validators) == 2
+
+        c.delete('test-conditional')
+        assert c.get('test-conditional') is None
+
+    # a server without validators
+    with StandIn() as srv:
+        c = Client(srv.uri, conditional=True)
+        c.update('test-conditional', series, 'Babar')
+        assert c.get('test-conditional').equals(c.get('test-conditional'))
+        assert c.validators.stats() == {
+            'entries': 0,
+            'revalidated': 0,
+            'modified': 0
+        }
+
+
+def test_decode_processes():
+    series = genserie(utcdt(2020, 1, 1), 'H', 1000)
+    with StandIn() as srv:
+        plain = Client(srv.uri)
+        for idx in range(3):
+            plain.update('test-decode', series + idx, 'Babar')
+        with Client(srv.uri, decode_processes=2, decode_threshold=0) as c:
+            assert c.get('test-decode').equals(plain.get('test-decode'))
+            assert c.staircase(
+                'test-decode', pd.Timedelta(hours=1)
+            ).equals(
+                plain.staircase('test-decode', pd.Timedelta(hours=1))
+            )
+            hist = c.history('test-decode')
+            expected = plain.history('test-decode')
+            assert list(hist) == list(expected)
+            for idate, series in hist.items():
+                assert series.equals(expected[idate])
+            res = c.get_many(['test-decode', 'no-such-series'])
+            assert res['no-such-series'] is None
+            assert c.decodepool.stats() == {'inline': 0, 'offloaded': 4}
+
+        c = Client(srv.uri, decode_processes=True)
+        c.get('test-decode')
+        assert c.decodepool.stats() == {'inline': 1, 'offloaded': 0}
+        c.close()
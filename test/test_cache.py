@@ -0,0 +1,54 @@
+import time
+
+import pandas as pd
+
+from tshistory.testutil import (
+    genserie,
+    utcdt
+)
+
+from tshistory_client.cache import SeriesCache
+
+
+def test_lru():
+    series = genserie(utcdt(2020, 1, 1), 'D', 10)
+    size = series.memory_usage(index=True, deep=True)
+
+    cache = SeriesCache(size * 2)
+    cache.put(('get', 'a', ()), series)
+    cache.put(('get', 'b', ()), series)
+    assert cache.get(('get', 'a', ())) is series
+    cache.put(('get', 'c', ()), series)
+    # b was the least recently used
+    assert cache.get(('get', 'b', ())) is None
+    assert cache.get(('get', 'c', ())) is series
+    assert cache.stats() == {
+        'entries': 2,
+        'bytes': size * 2,
+        'hits': 2,
+        'misses': 1,
+        'evictions': 1
+    }
+
+    # too big to be cached
+    cache.put(('get', 'd', ()), pd.concat([series] * 3))
+    assert len(cache) == 2
+
+    cache.invalidate('a')
+    assert cache.get(('get', 'a', ())) is None
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_ttl():
+    series = genserie(utcdt(2020, 1, 1), 'D', 10)
+    cache = SeriesCache(1e6)
+    cache.put(('get', 'a', ()), series, ttl=.1)
+    cache.put(('get', 'b', ()), series)
+    assert cache.get(('get', 'a', ())) is series
+    time.sleep(.15)
+    assert cache.get(('get', 'a', ())) is None
+    assert cache.get(('get', 'b', ())) is series
+    assert len(cache) == 1
@@ -0,0 +1,51 @@
+from tshistory_client.catalog import CatalogIndex
+
+
+def test_catalog_index():
+    main = ('db://localhost/db', 'tsh')
+    other = ('db://localhost/db', 'other')
+    index = CatalogIndex({
+        main: [
+            ['banana-spot', 'primary'],
+            ['banana-fcst', 'formula'],
+            ['apple', 'primary']
+        ],
+        other: [
+            ['banana-spot', 'primary'],
+            ['cherry', 'primary']
+        ]
+    })
+    assert len(index) == 4
+    assert 'cherry' in index
+    assert 'durian' not in index
+    # the first source wins
+    assert index.lookup('banana-spot') == (main, 'primary')
+    assert index.lookup('cherry') == (other, 'primary')
+
+    assert index.search('banana') == ['banana-fcst', 'banana-spot']
+    assert index.search('b') == ['banana-fcst', 'banana-spot']
+    assert index.search('c') == ['cherry']
+    assert index.search('d') == []
+    assert index.search('') == index.names()
+
+    index.add(main, 'banana-new', 'primary')
+    index.rename(main, 'apple', 'apricot')
+    index.remove(main, 'banana-spot')
+    assert index.search('banana') == [
+        'banana-fcst', 'banana-new', 'banana-spot'
+    ]
+    assert index.lookup('banana-spot') == (other, 'primary')
+    assert index.catalog() == {
+        main: [
+            ['banana-fcst', 'formula'],
+            ['banana-new', 'primary'],
+            ['apricot', 'primary']
+        ],
+        other: [
+            ['banana-spot', 'primary'],
+            ['cherry', 'primary']
+        ]
+    }
+
+    index.setsource(main, [['apple', 'primary']])
+    assert index.names() == ['apple', 'banana-spot', 'cherry']
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+from tshistory_client.coalesce import Coalescer
+
+
+def test_coalescer():
+    coalescer = Coalescer()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        release.wait()
+        return {'values': [1, 2]}
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(coalescer.do, 'key', func) for _ in range(4)]
+        while coalescer.stats()['coalesced'] < 3:
+            pass
+        assert coalescer.stats()['in_flight'] == 1
+        release.set()
+    results = [future.result() for future in futures]
+    assert calls == [1]
+    assert results == [{'values': [1, 2]}] * 4
+    # everyone got their own copy
+    results[0]['values'].append(3)
+    assert results[1] == {'values': [1, 2]}
+    assert coalescer.stats() == {'calls': 1, 'coalesced': 3, 'in_flight': 0}
+
+    # later calls are not shared
+    assert coalescer.do('key', lambda: 42) == 42
+    assert coalescer.do('other', lambda: 43) == 43
+    assert coalescer.stats()['calls'] == 3
+
+    # failures are shared as well
+    release.clear()
+
+    def fail():
+        release.wait()
+        raise ValueError('boom')
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(coalescer.do, 'key', fail) for _ in range(3)]
+        while coalescer.stats()['coalesced'] < 5:
+            pass
+        release.set()
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result()
+    assert coalescer.stats()['in_flight'] == 0
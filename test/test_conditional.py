@@ -0,0 +1,46 @@
+import pandas as pd
+
+from tshistory_client.conditional import Validators
+
+
+class response:
+
+    def __init__(self, **headers):
+        self.headers = headers
+
+
+def test_validators():
+    validators = Validators()
+    key = ('/series/state', 'a', (('name', 'a'),))
+    series = pd.Series([1., 2.])
+    assert validators.headers(key) == {}
+
+    assert validators.update(key, response(ETag='"1"'), series)
+    assert validators.headers(key) == {'If-None-Match': '"1"'}
+    reused = validators.reuse(key)
+    assert reused.equals(series)
+    reused.iloc[0] = 42
+    assert validators.reuse(key).iloc[0] == 1
+
+    # a modification date, when there is no etag
+    lastmodified = 'Wed, 01 Jan 2020 00:00:00 GMT'
+    assert validators.update(
+        key, response(**{'Last-Modified': lastmodified}), series
+    )
+    assert validators.headers(key) == {'If-Modified-Since': lastmodified}
+
+    # no validators: nothing held
+    assert not validators.update(key, response(), series)
+    assert validators.headers(key) == {}
+    assert validators.reuse(key) is None
+
+    validators.update(key, response(ETag='"1"'), series)
+    validators.invalidate('b')
+    assert len(validators) == 1
+    validators.invalidate('a')
+    assert len(validators) == 0
+    assert validators.stats() == {
+        'entries': 0,
+        'revalidated': 2,
+        'modified': 3
+    }
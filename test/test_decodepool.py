@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from tshistory_client.api import (
+    _decodehistory,
+    decodeseries,
+    encodeseries
+)
+from tshistory_client.decodepool import (
+    DecodePool,
+    _segment
+)
+from standin import _packhistory
+
+
+def test_decodepool():
+    series = pd.Series(
+        np.arange(100_001, dtype='float64'),
+        index=pd.date_range('2020-1-1', freq='min', periods=100_001, tz='UTC')
+    )
+    pool = DecodePool(2, threshold=1000)
+    try:
+        for expected in (
+                series,
+                series.tz_localize(None),
+                series[:3],  # inline
+                series[:0],
+                pd.Series(
+                    ['a', None, 'ccc'] * 1000,
+                    index=pd.date_range('2020-1-1', periods=3000)
+                )):
+            payload = encodeseries(expected)
+            decoded = pool.series('decoded', payload)
+            assert decoded.name == 'decoded'
+            assert decoded.index.dtype == expected.index.dtype
+            assert decoded.equals(decodeseries('decoded', payload))
+        assert pool.stats() == {'inline': 2, 'offloaded': 3}
+
+        # built over the shared memory, without copy
+        decoded = pool.series('decoded', encodeseries(series))
+        owner = decoded.values
+        while isinstance(owner, np.ndarray):
+            owner = owner.base
+        assert isinstance(owner, _segment)
+        decoded.iloc[0] = 42
+        del decoded, owner
+
+        payload = _packhistory(
+            {'tzaware': True, 'value_type': 'float64', 'value_dtype': '<f8'},
+            {
+                pd.Timestamp('2020-1-1', tz='UTC'): series[:50_000],
+                pd.Timestamp('2020-1-2', tz='UTC'): series[3:50_013]
+            }
+        )
+        hist = pool.history('hist', payload)
+        expected = _decodehistory('hist', payload)
+        assert list(hist) == list(expected)
+        for idate, series in hist.items():
+            assert series.equals(expected[idate])
+            assert series.name == 'hist'
+    finally:
+        pool.close()
+
+    # the shared memory blocks are gone
+    if os.path.isdir('/dev/shm'):
+        assert not [
+            name for name in os.listdir('/dev/shm')
+            if name.startswith('psm_')
+        ]
@@ -0,0 +1,98 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tshistory.testutil import (
+    assert_df,
+    genserie,
+    utcdt
+)
+
+from tshistory_client.diskcache import DiskCache
+
+
+def _write(path, i):
+    cache = DiskCache(path)
+    cache.putseries('shared', ('key',), genserie(utcdt(2020, 1, 1), 'D', 10))
+    return cache.getseries('shared', ('key',)).sum()
+
+
+def test_series(tmp_path):
+    cache = DiskCache(tmp_path)
+    assert cache.getseries('a', ('key',)) is None
+
+    series = genserie(utcdt(2020, 1, 1), 'D', 3)
+    cache.putseries('a', ('key',), series)
+    cached = cache.getseries('a', ('key',))
+    assert isinstance(cached.values, np.memmap)
+    assert cached.name == 'a'
+    assert_df("""
+2020-01-01 00:00:00+00:00    0.0
+2020-01-02 00:00:00+00:00    1.0
+2020-01-03 00:00:00+00:00    2.0
+""", cached)
+    # copy-on-write
+    cached.iloc[0] = 42
+    assert cache.getseries('a', ('key',)).iloc[0] == 0
+
+    naive = genserie(pd.Timestamp('2020-1-1'), 'D', 3)
+    cache.putseries('b', ('key',), naive)
+    assert cache.getseries('b', ('key',)).index.equals(naive.index)
+
+    # strings are not cached
+    cache.putseries('c', ('key',), pd.Series(['a'], index=naive.index[:1]))
+    assert cache.getseries('c', ('key',)) is None
+
+    cache.invalidate('a')
+    assert cache.getseries('a', ('key',)) is None
+    assert cache.getseries('b', ('key',)) is not None
+
+
+def test_history(tmp_path):
+    cache = DiskCache(tmp_path)
+    hist = {
+        utcdt(2021, 1, 1): genserie(utcdt(2020, 1, 1), 'D', 2),
+        utcdt(2021, 1, 2): genserie(utcdt(2020, 1, 1), 'D', 3) * 2
+    }
+    cache.puthistory('h', ('key',), hist)
+    cached = cache.gethistory('h', ('key',))
+    assert list(cached) == list(hist)
+    for idate, series in hist.items():
+        assert cached[idate].name == 'h'
+        assert cached[idate].equals(series.rename('h'))
+
+
+def test_eviction(tmp_path):
+    series = genserie(utcdt(2020, 1, 1), 'D', 1000)
+    cache = DiskCache(tmp_path)
+    cache.putseries('a', ('key',), series)
+    entrysize = cache.size()
+
+    cache = DiskCache(tmp_path, maxbytes=entrysize * 2)
+    cache.putseries('b', ('key',), series)
+    cache.getseries('a', ('key',))  # a is now the most recently used
+    cache.putseries('c', ('key',), series)
+    assert cache.getseries('b', ('key',)) is None
+    assert cache.getseries('a', ('key',)) is not None
+    assert cache.getseries('c', ('key',)) is not None
+
+    cache.evict()
+    assert cache.size() == 0
+
+    # the writes of the other processes are seen at the next scan
+    other = DiskCache(tmp_path)
+    cache.scan_every = 3
+    cache.putseries('a', ('key',), series)
+    other.putseries('b', ('key',), series)
+    other.putseries('c', ('key',), series)
+    cache.putseries('d', ('key',), series)
+    assert cache.size() == entrysize * 4
+    cache.putseries('e', ('key',), series)
+    assert cache.size() == entrysize * 2
+
+
+def test_concurrent_writers(tmp_path):
+    with ProcessPoolExecutor(4) as pool:
+        sums = list(pool.map(_write, [tmp_path] * 8, range(8)))
+    assert sums == [45.] * 8
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+from tshistory_client.history import History
+
+
+def ts(hour):
+    return pd.Timestamp('2020-1-1', tz='UTC') + pd.Timedelta(hours=hour)
+
+
+def series(values, hours):
+    return pd.Series(values, index=[ts(hour) for hour in hours], name='h')
+
+
+# full revisions: ts(6) is revised twice, ts(5) erased then republished
+REVISIONS = {
+    ts(0): series([1., 2., 3.], [5, 6, 7]),
+    ts(1): series([2., 3.], [6, 7]),
+    ts(2): series([2.5, 3.], [6, 7]),
+    ts(3): series([4., 2.5, 3.], [5, 6, 7])
+}
+
+
+def test_compaction():
+    hist = History.fromdict(REVISIONS, name='h')
+    assert len(hist) == 4
+    assert len(hist.vdates) == 6
+    assert list(hist.insertion_dates) == list(REVISIONS)
+
+    diffs = hist.to_dict(diffmode=True, _keep_nans=True)
+    assert diffs[ts(0)].equals(REVISIONS[ts(0)])
+    assert diffs[ts(1)].index.tolist() == [ts(5)]
+    assert np.isnan(diffs[ts(1)].iloc[0])
+    assert diffs[ts(2)].to_dict() == {ts(6): 2.5}
+    assert diffs[ts(3)].to_dict() == {ts(5): 4.}
+    assert hist.to_dict(diffmode=True)[ts(1)].empty
+
+    full = hist.to_dict()
+    assert list(full) == list(REVISIONS)
+    for idate, revision in REVISIONS.items():
+        assert full[idate].equals(revision)
+
+    # and back from the diffs
+    again = History.fromdict(diffs, name='h', diffmode=True)
+    for idate, revision in again.to_dict().items():
+        assert revision.equals(REVISIONS[idate])
+
+    naive = History.fromdict({
+        idate: revision.tz_localize(None)
+        for idate, revision in REVISIONS.items()
+    })
+    assert naive.asof().index.tz is None
+    assert naive.asof().tolist() == [4., 2.5, 3.]
+
+    empty = History.fromdict({})
+    assert len(empty) == 0
+    assert empty.asof().empty
+    assert empty.to_dict() == {}
+
+
+def test_analytics():
+    hist = History.fromdict(REVISIONS, name='h')
+
+    assert hist.asof().equals(REVISIONS[ts(3)])
+    assert hist.asof(ts(1.5)).equals(REVISIONS[ts(1)])
+    assert hist.asof(pd.Timestamp('2020-1-1 02:30')).equals(
+        REVISIONS[ts(2)]
+    )
+    assert hist.asof(ts(-1)).empty
+
+    assert hist.first().to_dict() == {ts(5): 1., ts(6): 2., ts(7): 3.}
+    assert hist.last().to_dict() == {ts(5): 4., ts(6): 2.5, ts(7): 3.}
+    assert hist.count().to_dict() == {ts(5): 3, ts(6): 2, ts(7): 1}
+
+    deltas = hist.deltas()
+    assert deltas.index.names == ['value_date', 'insertion_date']
+    assert deltas.to_dict() == {
+        (ts(5), ts(3)): 3.,
+        (ts(6), ts(2)): .5
+    }
+
+    assert hist.staircase(pd.Timedelta(hours=5)).to_dict() == {
+        ts(5): 1., ts(6): 2., ts(7): 3.
+    }
+    stairs = hist.staircases(['0h', '3h'])
+    assert stairs['0h'].to_dict() == {ts(5): 4., ts(6): 2.5, ts(7): 3.}
+    assert stairs['3h'].to_dict() == {ts(6): 2.5, ts(7): 3.}
+
+
+def test_running_states():
+    # random revisions with erasures, and states read from a middle
+    # insertion date on
+    rng = np.random.default_rng(42)
+    revisions = {}
+    for rev in range(50):
+        hours = np.sort(rng.choice(48, size=rng.integers(1, 20), replace=False))
+        revisions[ts(100 + rev)] = series(rng.random(len(hours)), hours)
+    hist = History.fromdict(revisions, name='h')
+
+    full = hist.to_dict()
+    for idate, revision in revisions.items():
+        assert full[idate].equals(revision)
+        assert full[idate].equals(hist.asof(idate))
+
+    part = hist.to_dict(from_insertion_date=ts(120), to_insertion_date=ts(130))
+    assert list(part) == [ts(100 + rev) for rev in range(20, 31)]
+    for idate, revision in part.items():
+        assert revision.equals(revisions[idate])
+
+
+def test_window():
+    hist = History.fromdict(REVISIONS, name='h')
+    assert hist.window() is hist
+
+    # ts(6) only: the erasure of ts(5) is out of the bounds
+    windowed = hist.window(ts(6), ts(6))
+    assert list(windowed.insertion_dates) == [ts(0), ts(2)]
+    assert windowed.to_dict()[ts(2)].to_dict() == {ts(6): 2.5}
+
+    windowed = hist.window(from_value_date=ts(7))
+    assert list(windowed.insertion_dates) == [ts(0)]
+    assert windowed.asof().to_dict() == {ts(7): 3.}
+
+    windowed = hist.window(to_value_date=ts(5))
+    assert list(windowed.insertion_dates) == [ts(0), ts(1), ts(3)]
+    assert windowed.to_dict()[ts(1)].empty
+    assert windowed.to_dict(diffmode=True, _keep_nans=True)[
+        ts(1)].isnull().all()
@@ -0,0 +1,51 @@
+from tshistory_client.metrics import Metrics
+
+
+def event(method='GET', endpoint='/series/state', status=200,
+          http_time=.01, decode_time=0.):
+    return {
+        'method': method,
+        'endpoint': endpoint,
+        'name': 'a',
+        'status': status,
+        'sent': 10,
+        'received': 100,
+        'sent_uncompressed': 10,
+        'received_uncompressed': 400,
+        'http_time': http_time,
+        'decode_time': decode_time
+    }
+
+
+def test_metrics():
+    metrics = Metrics(buckets=(.01, .1, 1, float('inf')))
+    metrics(event(http_time=.005))
+    metrics(event(http_time=.05, decode_time=.01))
+    metrics(event(http_time=.5, status=503))
+    metrics(event(http_time=5, status=None))
+    metrics(event(method='PATCH', http_time=.02))
+
+    stats = metrics.stats()
+    assert stats['GET /series/state'] == {
+        'requests': 4,
+        'errors': 2,
+        'sent': 40,
+        'received': 400,
+        'sent_uncompressed': 40,
+        'received_uncompressed': 1600,
+        'sent_ratio': 1.,
+        'received_ratio': 4.,
+        'http_time': 5.555,
+        'decode_time': .01,
+        'histogram': {.01: 1, .1: 1, 1: 1, float('inf'): 1}
+    }
+    assert stats['PATCH /series/state']['histogram'] == {
+        .01: 0, .1: 1, 1: 0, float('inf'): 0
+    }
+
+    assert metrics.quantile('GET /series/state', .25) == .01
+    assert metrics.quantile('GET /series/state', .5) == .1
+    assert metrics.quantile('GET /series/state', .99) == float('inf')
+
+    metrics.reset()
+    assert metrics.stats() == {}
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+from tshistory.testutil import (
+    genserie,
+    utcdt
+)
+
+from tshistory_client.api import Client
+from tshistory_client.history import History
+
+
+def populate(client, name, start):
+    for idx in range(5):
+        client.update(
+            name,
+            genserie(start + pd.Timedelta(hours=idx), 'H', 6, initval=[idx]),
+            'Babar',
+            insertion_date=utcdt(2020, 1, 1) + pd.Timedelta(hours=idx)
+        )
+    # an erased point
+    client.update(
+        name,
+        pd.Series([np.nan], index=[start + pd.Timedelta(hours=7)]),
+        'Babar',
+        insertion_date=utcdt(2020, 1, 2)
+    )
+
+
+def assert_same(replica, server, name):
+    for revision_date in (None, utcdt(2019, 1, 1), utcdt(2020, 1, 1, 2)):
+        assert replica.get(name, revision_date=revision_date).equals(
+            server.get(name, revision_date=revision_date)
+        )
+    bounds = dict(
+        from_value_date=pd.Timestamp('2020-1-1 3:00'),
+        to_value_date=utcdt(2020, 1, 1, 5)
+    )
+    assert replica.get(name, **bounds).equals(server.get(name, **bounds))
+    for delta in ('0h', '2h', '5h'):
+        delta = pd.Timedelta(delta)
+        assert replica.staircase(name, delta, **bounds).equals(
+            server.staircase(name, delta, **bounds)
+        )
+    for kw in (
+            {},
+            {'diffmode': True},
+            {'diffmode': True, '_keep_nans': True},
+            {'from_insertion_date': utcdt(2020, 1, 1, 2)},
+            {'to_insertion_date': utcdt(2020, 1, 1, 3), 'diffmode': True},
+            bounds,
+            dict(bounds, diffmode=True)):
+        expected = server.history(name, **kw)
+        hist = replica.history(name, **kw)
+        assert list(hist) == list(expected)
+        for idate, series in hist.items():
+            assert series.equals(expected[idate])
+
+
+def test_replica(client):
+    server = client
+    populate(server, 'test-replica-hot-aware', utcdt(2020, 1, 1))
+    populate(server, 'test-replica-hot-naive', pd.Timestamp('2020-1-1'))
+    populate(server, 'test-replica-cold', utcdt(2020, 1, 1))
+
+    client = Client(server.uri, replica='test-replica-hot-*', replica_ttl=None)
+    assert 'test-replica-hot-aware' in client.replica
+    assert 'test-replica-cold' not in client.replica
+    assert client.replica.names() == [
+        'test-replica-hot-aware', 'test-replica-hot-naive'
+    ]
+
+    assert_same(client, server, 'test-replica-hot-aware')
+    assert_same(client, server, 'test-replica-hot-naive')
+    assert isinstance(
+        client.history('test-replica-hot-aware', columnar=True), History
+    )
+    assert client.replica.stats()['loads'] == 2
+
+    # served locally
+    reads = client.replica.stats()['reads']
+    assert_same(client, client, 'test-replica-hot-aware')
+    client.get('test-replica-cold')
+    stats = client.replica.stats()
+    assert stats['loads'] == 2
+    assert stats['syncs'] == 0
+    assert stats['reads'] > reads
+
+    # new revisions come as diffs
+    server.update(
+        'test-replica-hot-aware',
+        genserie(utcdt(2020, 1, 1, 3), 'H', 10, initval=[9]),
+        'Babar',
+        insertion_date=utcdt(2020, 1, 3)
+    )
+    assert not client.get('test-replica-hot-aware').equals(
+        server.get('test-replica-hot-aware')
+    )
+    client.replica.sync()
+    assert client.replica.stats()['syncs'] == 2
+    assert_same(client, server, 'test-replica-hot-aware')
+
+    # our own writes are seen
+    client.update(
+        'test-replica-hot-naive',
+        genserie(pd.Timestamp('2020-1-1 8:00'), 'H', 3, initval=[7]),
+        'Babar',
+        insertion_date=utcdt(2020, 1, 4)
+    )
+    assert_same(client, server, 'test-replica-hot-naive')
+    client.rename('test-replica-hot-naive', 'test-replica-hot-renamed')
+    assert client.get('test-replica-hot-naive') is None
+    assert client.get('test-replica-hot-renamed').equals(
+        server.get('test-replica-hot-renamed')
+    )
+    client.delete('test-replica-hot-renamed')
+    assert client.get('test-replica-hot-renamed') is None
+    assert client.history('test-replica-hot-nope') is None
+
+    # a ttl of 0 syncs on each read
+    client = Client(server.uri, replica=['test-replica-hot-aware'], replica_ttl=0)
+    client.get('test-replica-hot-aware')
+    client.get('test-replica-hot-aware')
+    assert client.replica.stats()['syncs'] == 1
+
+
+def test_replica_bounded_history(client):
+    # the revisions not touching the value dates bounds are left out
+    # by the server (diffs and full revisions alike)
+    def hours(hist):
+        return {
+            idate: {
+                vdate.hour: None if pd.isnull(value) else value
+                for vdate, value in series.items()
+            }
+            for idate, series in hist.items()
+        }
+
+    hour = lambda hour: utcdt(2020, 1, 1, hour)
+    bounds = dict(from_value_date=hour(7), to_value_date=hour(8))
+    expected = {
+        (): {
+            hour(2): {7: 2},
+            hour(3): {7: 3, 8: 3},
+            hour(4): {7: 4, 8: 4},
+            utcdt(2020, 1, 2): {8: 4}
+        },
+        (('diffmode', True),): {
+            hour(2): {7: 2},
+            hour(3): {7: 3, 8: 3},
+            hour(4): {7: 4, 8: 4},
+            utcdt(2020, 1, 2): {}
+        },
+        (('diffmode', True), ('_keep_nans', True)): {
+            hour(2): {7: 2},
+            hour(3): {7: 3, 8: 3},
+            hour(4): {7: 4, 8: 4},
+            utcdt(2020, 1, 2): {7: None}
+        },
+        (('diffmode', True), ('from_insertion_date', hour(3))): {
+            hour(3): {7: 3, 8: 3},
+            hour(4): {7: 4, 8: 4},
+            utcdt(2020, 1, 2): {}
+        }
+    }
+    name = 'test-replica-bounded'
+    populate(client, name, utcdt(2020, 1, 1))
+    replicated = Client(client.uri, replica=[name])
+    for kw, hist in expected.items():
+        kw = dict(kw, **bounds)
+        assert hours(replicated.history(name, **kw)) == hist
+        assert hours(client.history(name, **kw)) == hist
@@ -0,0 +1,78 @@
+import requests
+from urllib3.exceptions import (
+    MaxRetryError,
+    NewConnectionError
+)
+
+from tshistory_client.retry import RetryPolicy
+
+
+def refused():
+    return requests.ConnectionError(
+        MaxRetryError(
+            None, 'http://x', NewConnectionError(None, 'refused')
+        )
+    )
+
+
+def test_retryable():
+    policy = RetryPolicy()
+    reset = requests.ConnectionError('connection reset by peer')
+
+    # reads are retried freely
+    assert policy.retryable('get', '/series/state', status=503)
+    assert policy.retryable('get', '/series/state', status=500)
+    assert not policy.retryable('get', '/series/state', status=404)
+    assert policy.retryable('get', '/series/state', error=reset)
+    assert policy.retryable(
+        'get', '/series/state', error=requests.ReadTimeout()
+    )
+    assert policy.retryable('put', '/series/metadata', error=reset)
+
+    # writes only when they cannot have been processed
+    assert policy.retryable('patch', '/series/state', status=503)
+    assert policy.retryable('patch', '/series/state', status=429)
+    assert not policy.retryable('patch', '/series/state', status=500)
+    assert not policy.retryable('patch', '/series/state', error=reset)
+    assert not policy.retryable(
+        'patch', '/series/state', error=requests.ReadTimeout()
+    )
+    assert policy.retryable('patch', '/series/state', error=refused())
+    assert policy.retryable(
+        'delete', '/series/state', error=requests.ConnectTimeout()
+    )
+
+
+def test_budget():
+    policy = RetryPolicy(retries=3, minretries=2, budget=.5)
+    policy.started()
+    assert policy.allows('get', '/series/state', 0, status=503)
+    assert policy.allows('get', '/series/state', 1, status=503)
+    # the reserve is spent
+    assert not policy.allows('get', '/series/state', 2, status=503)
+
+    policy.started()
+    policy.started()
+    assert policy.allows('get', '/series/state', 0, status=503)
+    assert not policy.allows('get', '/series/state', 1, status=503)
+    # no more than `retries`
+    assert not policy.allows('get', '/series/state', 3, status=503)
+
+    assert policy.stats() == {
+        'requests': 3,
+        'retries': 3,
+        'budget_exhausted': 2,
+        'endpoints': {'GET /series/state': 3}
+    }
+
+
+def test_delay():
+    policy = RetryPolicy(backoff=.1, maxdelay=1)
+    for attempt in range(10):
+        delay = policy.delay(attempt)
+        assert 0 <= delay <= min(.1 * 2 ** attempt, 1)
+    assert policy.delay(0, retryafter='3') == 1
+    assert policy.delay(0, retryafter='0.5') == .5
+    assert policy.delay(
+        0, retryafter='Wed, 21 Oct 2015 07:28:00 GMT'
+    ) <= .1
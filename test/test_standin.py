@@ -0,0 +1,62 @@
+import pandas as pd
+
+from tshistory.testutil import (
+    assert_df,
+    genserie,
+    utcdt
+)
+
+from tshistory_client.api import Client
+from standin import StandIn
+
+
+def test_standin():
+    with StandIn() as srv:
+        client = Client(srv.uri)
+        assert not client.exists('standin')
+
+        for idx, idate in enumerate(
+                pd.date_range(utcdt(2020, 1, 1), freq='D', periods=3)):
+            client.update(
+                'standin',
+                genserie(idate, 'H', 3, initval=[idx]),
+                'Babar',
+                insertion_date=idate
+            )
+        assert client.exists('standin')
+
+        assert_df("""
+2020-01-01 00:00:00+00:00    0.0
+2020-01-01 01:00:00+00:00    0.0
+2020-01-01 02:00:00+00:00    0.0
+2020-01-02 00:00:00+00:00    1.0
+2020-01-02 01:00:00+00:00    1.0
+2020-01-02 02:00:00+00:00    1.0
+2020-01-03 00:00:00+00:00    2.0
+2020-01-03 01:00:00+00:00    2.0
+2020-01-03 02:00:00+00:00    2.0
+""", client.get('standin'))
+
+        assert len(client.get(
+            'standin', revision_date=utcdt(2020, 1, 1)
+        )) == 3
+
+        hist = client.history('standin', diffmode=True)
+        assert list(hist) == list(
+            pd.date_range(utcdt(2020, 1, 1), freq='D', periods=3)
+        )
+        assert [diff.tolist() for diff in hist.values()] == [
+            [0.] * 3, [1.] * 3, [2.] * 3
+        ]
+
+        client.update_metadata('standin', {'unit': 'MW'})
+        assert client.metadata('standin') == {'unit': 'MW'}
+        assert client.catalog() == {
+            ('http://standin', 'tsh'): [['standin', 'primary']]
+        }
+
+        client.rename('standin', 'renamed')
+        assert not client.exists('standin')
+        client.delete('renamed')
+        assert srv.revisions == {}
+        assert srv.requests == 14
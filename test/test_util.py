@@ -0,0 +1,127 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tshistory.util import (
+    nary_pack,
+    numpy_serialize
+)
+from tshistory.testutil import (
+    genserie,
+    utcdt
+)
+
+from tshistory_client.util import (
+    alignframe,
+    frombuffers,
+    iter_nary,
+    staircases
+)
+
+
+def chunked(bytestr, size):
+    return (
+        bytestr[i:i + size]
+        for i in range(0, len(bytestr), size)
+    )
+
+
+def test_iter_nary():
+    items = [b'', b'a', b'hello' * 1000, bytes(range(256)) * 100]
+    packed = zlib.compress(nary_pack(*items))
+    for chunksize in (1, 7, 100, len(packed)):
+        for maxsize in (1, 13, 1 << 20):
+            out = list(iter_nary(chunked(packed, chunksize), maxsize))
+            assert [o.tobytes() for o in out] == items
+
+    with pytest.raises(ValueError):
+        list(iter_nary([packed[:len(packed) // 2]]))
+
+
+def test_frombuffers():
+    for series, meta in (
+            (genserie(utcdt(2020, 1, 1), 'H', 5),
+             {'tzaware': True,
+              'value_type': 'float64', 'value_dtype': '<f8'}),
+            (genserie(pd.Timestamp('2020-1-1'), 'H', 5),
+             {'tzaware': False,
+              'value_type': 'float64', 'value_dtype': '<f8'}),
+            (pd.Series(['a', None, 'c'],
+                       index=pd.date_range('2020-1-1', periods=3)),
+             {'tzaware': False,
+              'value_type': 'object', 'value_dtype': '|O'})):
+        bindex, bvalues = numpy_serialize(
+            series, meta['value_type'] == 'object'
+        )
+        out = frombuffers(
+            np.frombuffer(bytearray(bindex), dtype=np.uint8),
+            np.frombuffer(bytearray(bvalues), dtype=np.uint8),
+            meta
+        )
+        assert out.index.equals(series.index)
+        assert out.values.tolist() == series.values.tolist()
+
+
+def test_alignframe():
+    a = genserie(utcdt(2020, 1, 1), 'H', 4)
+    b = genserie(utcdt(2020, 1, 1, 2), 'H', 4).astype('int64') * 2
+    c = genserie(utcdt(2020, 1, 1), 'H', 4) + 1
+    frame = alignframe({'a': a, 'b': b, 'c': c})
+    expected = pd.concat({'a': a, 'b': b, 'c': c}, axis=1)
+    assert frame.equals(expected)
+    assert frame.index.tz is not None
+    assert frame.columns.tolist() == ['a', 'b', 'c']
+
+    # no copy of the preallocated storage
+    assert frame.values.flags['F_CONTIGUOUS']
+
+    # strings are aligned the slow way
+    s = a.astype(str)
+    assert alignframe({'a': a, 's': s}).equals(
+        pd.concat({'a': a, 's': s}, axis=1)
+    )
+
+    with pytest.raises(ValueError) as err:
+        alignframe({'a': a, 'naive': a.tz_localize(None)})
+    assert str(err.value) == (
+        'cannot align tz-aware and naive series: '
+        'a (tz-aware), naive (naive)'
+    )
+
+    assert alignframe({}).empty
+
+
+def test_staircases():
+    def ts(hour):
+        return pd.Timestamp('2020-1-1', tz='UTC') + pd.Timedelta(hours=hour)
+
+    hist = {
+        ts(0): pd.Series([1., 2., 3.], index=[ts(5), ts(6), ts(7)]),
+        # erases ts(5)
+        ts(1): pd.Series([np.nan], index=[ts(5)]),
+        ts(6.5): pd.Series([30.], index=[ts(7)])
+    }
+    stairs = staircases(
+        hist,
+        [pd.Timedelta(0), pd.Timedelta(hours=2), pd.Timedelta(hours=5)],
+        'stair'
+    )
+    assert stairs[pd.Timedelta(0)].to_dict() == {ts(6): 2., ts(7): 30.}
+    assert stairs[pd.Timedelta(hours=2)].to_dict() == {ts(6): 2., ts(7): 3.}
+    assert stairs[pd.Timedelta(hours=5)].to_dict() == {
+        ts(5): 1., ts(6): 2., ts(7): 3.
+    }
+    assert stairs[pd.Timedelta(0)].name == 'stair'
+    assert stairs[pd.Timedelta(0)].index.tz is not None
+
+    naive = {
+        idate: series.tz_localize(None)
+        for idate, series in hist.items()
+    }
+    stair = staircases(naive, [pd.Timedelta(0)])[pd.Timedelta(0)]
+    assert stair.index.tz is None
+    assert stair.tolist() == [2., 30.]
+
+    assert staircases({}, ['1h'])['1h'].empty
@@ -0,0 +1,313 @@
+import asyncio
+import json
+
+import httpx
+
+from tshistory.util import tojson
+from tshistory_client.api import (
+    _check,
+    _decodecatalog,
+    _decodehistory,
+    _decodeinterval,
+    _history_query,
+    _insert_query,
+    _staircase_query,
+    _state_query,
+    decodeseries,
+    encodeseries
+)
+
+
+def _form(data):
+    # encode like python-requests does: drop the None values and
+    # stringify the others (e.g. True -> 'True')
+    return {
+        k: str(v)
+        for k, v in data.items()
+        if v is not None
+    }
+
+
+class AsyncClient:
+    """Asyncio flavour of `tshistory_client.api.Client`.
+
+    It needs the `httpx` package. All coroutines share one pooled
+    connection set; `max_connections` bounds the open connections
+    and `max_concurrency` the number of in-flight requests (callers
+    beyond that wait their turn).
+
+    The payloads of at least `decode_threshold` bytes are decoded in
+    the default executor of the loop, so that the other coroutines
+    keep running meanwhile.
+    """
+    uri = None
+    session = None
+
+    def __init__(self, uri,
+                 timeout=None,
+                 max_connections=10,
+                 max_keepalive_connections=10,
+                 max_concurrency=None,
+                 upload_format='tshpack',
+                 decode_threshold=1 << 20,
+                 transport=None):
+        assert upload_format in ('tshpack', 'json')
+        self.uri = uri
+        self.upload_format = upload_format
+        self.decode_threshold = decode_threshold
+        self.session = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            transport=transport
+        )
+        self._slots = asyncio.Semaphore(
+            max_concurrency or max_connections
+        )
+
+    def __repr__(self):
+        return f"tshistory-http-async-client(uri='{self.uri}')"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.session.aclose()
+
+    async def _request(self, method, path, params=None, data=None, files=None):
+        async with self._slots:
+            return await self.session.request(
+                method.upper(),
+                f'{self.uri}{path}',
+                params=_form(params) if params else None,
+                data=_form(data) if data else None,
+                files=files
+            )
+
+    async def _decode(self, decode, name, content):
+        # the large payloads are decoded off the event loop
+        if len(content) < self.decode_threshold:
+            return decode(name, content)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, decode, name, content
+        )
+
+    async def exists(self, name):
+        meta = await self.metadata(name)
+        if 'message' in meta and meta['message'].endswith('does not exists'):
+            return False
+        return True
+
+    async def _insert(self, name, series, author,
+                      metadata=None, insertion_date=None,
+                      replace=False):
+        qdata = _insert_query(
+            name, series, author,
+            metadata=metadata,
+            insertion_date=insertion_date,
+            replace=replace
+        )
+
+        res = None
+        if self.upload_format == 'tshpack':
+            res = await self._request(
+                'patch', '/series/state',
+                data=dict(qdata, format='tshpack'),
+                files={'bseries': encodeseries(series)}
+            )
+            if res.status_code in (400, 415):
+                res = None
+
+        if res is None:
+            qdata['series'] = tojson(series)
+            res = await self._request(
+                'patch', '/series/state', data=qdata
+            )
+            if (self.upload_format == 'tshpack' and
+                res.status_code not in (400, 415)):
+                self.upload_format = 'json'
+
+        _check(res, 200, 201, 405)
+        if res.status_code == 405:
+            raise ValueError(res.json()['message'])
+
+    async def update(self, name, series, author, metadata=None, insertion_date=None):
+        return await self._insert(
+            name, series, author,
+            metadata=metadata,
+            insertion_date=insertion_date
+        )
+
+    async def replace(self, name, series, author, metadata=None, insertion_date=None):
+        return await self._insert(
+            name, series, author,
+            metadata=metadata,
+            insertion_date=insertion_date,
+            replace=True
+        )
+
+    async def metadata(self, name, all=False):
+        res = await self._request(
+            'get', '/series/metadata', params={
+                'name': name,
+                'all': int(all)
+            }
+        )
+        _check(res, 200, 404)
+        return res.json()
+
+    async def update_metadata(self, name, metadata):
+        assert isinstance(metadata, dict)
+        res = await self._request(
+            'put', '/series/metadata', data={
+                'name': name,
+                'metadata': json.dumps(metadata)
+            }
+        )
+        _check(res, 200, 405)
+        if res.status_code == 405:
+            raise ValueError(res.json()['message'])
+
+    async def get(self, name,
+                  revision_date=None,
+                  from_value_date=None,
+                  to_value_date=None):
+        res = await self._request(
+            'get', '/series/state', params=_state_query(
+                name,
+                revision_date=revision_date,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date
+            )
+        )
+        if res.status_code == 404:
+            return None
+        _check(res, 200)
+
+        return await self._decode(decodeseries, name, res.content)
+
+    async def staircase(self, name, delta,
+                        from_value_date=None,
+                        to_value_date=None):
+        res = await self._request(
+            'get', '/series/staircase', params=_staircase_query(
+                name, delta,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date
+            )
+        )
+        if res.status_code == 404:
+            return None
+        _check(res, 200)
+
+        return await self._decode(decodeseries, name, res.content)
+
+    async def history(self, name,
+                      from_insertion_date=None,
+                      to_insertion_date=None,
+                      from_value_date=None,
+                      to_value_date=None,
+                      diffmode=False,
+                      _keep_nans=False):
+        res = await self._request(
+            'get', '/series/history', params=_history_query(
+                name,
+                from_insertion_date=from_insertion_date,
+                to_insertion_date=to_insertion_date,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date,
+                diffmode=diffmode,
+                _keep_nans=_keep_nans
+            )
+        )
+        if res.status_code == 404:
+            return None
+        _check(res, 200)
+
+        return await self._decode(_decodehistory, name, res.content)
+
+    async def type(self, name):
+        res = await self._request(
+            'get', '/series/metadata', params={
+                'name': name,
+                'type': 'type'
+            }
+        )
+        _check(res, 200, 404)
+        if res.status_code == 200:
+            return res.json()
+
+    async def interval(self, name):
+        res = await self._request(
+            'get', '/series/metadata', params={
+                'name': name,
+                'type': 'interval'
+            }
+        )
+        _check(res, 200, 204, 404)
+        if res.status_code == 200:
+            return _decodeinterval(res.json())
+        raise ValueError(f'no interval for series: {name}')
+
+    async def catalog(self, allsources=True):
+        res = await self._request(
+            'get', '/series/catalog', params={
+                'allsources': allsources
+            }
+        )
+        _check(res, 200)
+
+        return _decodecatalog(res.json())
+
+    async def rename(self, oldname, newname):
+        res = await self._request(
+            'put', '/series/state',
+            data={'name': oldname, 'newname': newname}
+        )
+        _check(res, 204)
+
+    async def delete(self, name):
+        res = await self._request(
+            'delete', '/series/state',
+            data={'name': name}
+        )
+        _check(res, 204)
+
+    # formula
+
+    async def formula(self, name):
+        res = await self._request(
+            'get', '/series/formula', params={
+                'name': name
+            }
+        )
+        if res.status_code == 200:
+            return res.json()
+
+    async def register_formula(self, name,
+                               formula,
+                               reject_unknown=True,
+                               update=False):
+        res = await self._request(
+            'patch', '/series/formula', data={
+                'name': name,
+                'text': formula,
+                'reject_unknown': reject_unknown,
+                'force_update': update
+            }
+        )
+        if res.status_code == 400:
+            raise SyntaxError(res.json()['message'])
+        elif res.status_code == 409:
+            msg = res.json()['message']
+            if 'unknown' in msg:
+                raise ValueError(msg)
+            elif 'exists' in msg:
+                raise AssertionError(msg)
+
+        return res.json()
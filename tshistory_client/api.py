@@ -1,16 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import gzip
 import json
+import threading
+import time
 import zlib
 
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import pytz
 
 from tshistory.util import (
-    nary_unpack,
-    numpy_deserialize,
+    nary_pack,
+    numpy_serialize,
     tojson,
-    tzaware_serie,
-    unpack_history
+    tzaware_serie
+)
+
+from tshistory_client.cache import SeriesCache
+from tshistory_client.catalog import CatalogIndex
+from tshistory_client.coalesce import Coalescer
+from tshistory_client.conditional import Validators
+from tshistory_client.decodepool import DecodePool
+from tshistory_client.diskcache import DiskCache
+from tshistory_client.history import History
+from tshistory_client.metrics import Metrics
+from tshistory_client.replica import Replica
+from tshistory_client.retry import RetryPolicy
+from tshistory_client.util import (
+    alignframe,
+    frombuffers,
+    iter_nary,
+    staircases
 )
 
 
@@ -26,53 +48,730 @@ def strft(dt):
     return dt.isoformat()
 
 
-def decodeseries(name, bytestream):
-    bmeta, bindex, bvalues = nary_unpack(
-        zlib.decompress(bytestream)
-    )
-    meta = json.loads(bmeta)
-    index, values = numpy_deserialize(bindex, bvalues, meta)
-    series = pd.Series(values, index=index)
-    if meta['tzaware']:
-        series = series.tz_localize('UTC')
+def _ispast(dt):
+    return pd.Timestamp(strft(dt)) < pd.Timestamp.now(tz='UTC')
+
+
+def _decodeseries(name, chunks):
+    # the index and values are views over the inflated buffers:
+    # no intermediate copy of the payload is made
+    bmeta, bindex, bvalues = iter_nary(chunks)
+    meta = json.loads(bmeta.tobytes())
+    series = frombuffers(bindex, bvalues, meta)
     series.name = name
     return series
 
 
+def decodeseries(name, bytestream):
+    return _decodeseries(name, [bytestream])
+
+
+def encodeseries(series):
+    tzaware = tzaware_serie(series)
+    meta = {
+        'tzaware': tzaware,
+        'index_type': str(series.index.dtype),
+        'index_dtype': series.index.dtype.str,
+        'value_type': str(series.dtype),
+        'value_dtype': series.dtype.str
+    }
+    bindex, bvalues = numpy_serialize(
+        series,
+        meta['value_type'] == 'object'
+    )
+    return zlib.compress(
+        nary_pack(
+            json.dumps(meta).encode('utf-8'),
+            bindex,
+            bvalues
+        )
+    )
+
+
+# query building and response decoding, shared with the async client
+
+def _state_query(name,
+                 revision_date=None,
+                 from_value_date=None,
+                 to_value_date=None):
+    args = {
+        'name': name,
+        'format': 'tshpack'
+    }
+    if revision_date:
+        args['insertion_date'] = strft(revision_date)
+    if from_value_date:
+        args['from_value_date'] = strft(from_value_date)
+    if to_value_date:
+        args['to_value_date'] = strft(to_value_date)
+    return args
+
+
+def _staircase_query(name, delta,
+                     from_value_date=None,
+                     to_value_date=None):
+    args = {
+        'name': name,
+        'delta': delta,
+        'format': 'tshpack'
+    }
+    if from_value_date:
+        args['from_value_date'] = strft(from_value_date)
+    if to_value_date:
+        args['to_value_date'] = strft(to_value_date)
+    return args
+
+
+def _history_query(name,
+                   from_insertion_date=None,
+                   to_insertion_date=None,
+                   from_value_date=None,
+                   to_value_date=None,
+                   diffmode=False,
+                   _keep_nans=False):
+    args = {
+        'name': name,
+        'format': 'tshpack',
+        'diffmode': json.dumps(diffmode),
+        '_keep_nans': json.dumps(_keep_nans)
+    }
+    if from_insertion_date:
+        args['from_insertion_date'] = strft(from_insertion_date)
+    if to_insertion_date:
+        args['to_insertion_date'] = strft(to_insertion_date)
+    if from_value_date:
+        args['from_value_date'] = strft(from_value_date)
+    if to_value_date:
+        args['to_value_date'] = strft(to_value_date)
+    return args
+
+
+def _insert_query(name, series, author,
+                  metadata=None,
+                  insertion_date=None,
+                  replace=False):
+    qdata = {
+        'name': name,
+        'author': author,
+        'insertion_date': insertion_date.isoformat() if insertion_date else None,
+        'tzaware': tzaware_serie(series),
+        'replace': replace
+    }
+    if metadata:
+        qdata['metadata'] = json.dumps(metadata)
+    return qdata
+
+
+def _iterhistory(name, chunks):
+    items = iter_nary(chunks)
+    meta = json.loads(next(items).tobytes())
+    idates = next(items).view('<i8')
+    for idate, bindex, bvalues in zip(idates, items, items):
+        series = frombuffers(bindex, bvalues, meta)
+        series.name = name
+        yield pd.Timestamp(idate, tz='UTC'), series
+
+
+def _decodehistory(name, bytestream):
+    return dict(_iterhistory(name, [bytestream]))
+
+
+def _decodeinterval(jsonval):
+    tzaware, left, right = jsonval
+    tz = 'utc' if tzaware else None
+    return pd.Interval(
+        pd.Timestamp(left, tz=tz),
+        pd.Timestamp(right, tz=tz),
+        closed='both'
+    )
+
+
+def _decodecatalog(jsonval):
+    return {
+        tuple(k.split('!')): v
+        for k, v in jsonval.items()
+    }
+
+
+def _patch(series, diff):
+    # apply a revision diff (where nans stand for erased points)
+    series = pd.concat([
+        series[~series.index.isin(diff.index)],
+        diff
+    ]).sort_index()
+    return series[series.notnull()]
+
+
+class UnexpectedStatus(requests.HTTPError, AssertionError):
+    """The server answered with an unexpected status.
+
+    It is both a `requests.HTTPError` and an `AssertionError`, as the
+    failures it replaces.
+    """
+
+    def __init__(self, res, expected):
+        self.status = res.status_code
+        self.expected = expected
+        super().__init__(
+            f'{res.request.method} {res.url}: status {res.status_code} '
+            f'(expected {", ".join(map(str, expected))}): '
+            f'{res.text[:200]}',
+            response=res
+        )
+
+
+class ServerError(UnexpectedStatus):
+    """The server failed (5xx status)."""
+
+
+def _check(res, *expected):
+    if res.status_code not in expected:
+        if res.status_code >= 500:
+            raise ServerError(res, expected)
+        raise UnexpectedStatus(res, expected)
+
+
+def _wirebytes(res):
+    # size of the response body as received (before its decoding)
+    try:
+        return res.raw.tell()
+    except AttributeError:
+        return len(res.content)
+
+
+class BatchResult(dict):
+    """Results of a batch call, keyed by item.
+
+    Items which failed are not in the dict: their exception is
+    found in `.errors` instead. `.elapsed` is the wall time of the
+    batch and `.throughput` the number of processed items per
+    second.
+    """
+    elapsed = None
+    throughput = None
+
+    def __init__(self):
+        super().__init__()
+        self.errors = {}
+
+    def frame(self):
+        """Align the series of the batch in a single dataframe."""
+        return alignframe({
+            name: series
+            for name, series in self.items()
+            if series is not None
+        })
+
+
 class Client:
     uri = None
+    session = None
+    timeout = None
+    pool_maxsize = None
+    cache = None
+    diskcache = None
+    metrics = None
+    listeners = ()
+    catalog_ttl = None
+    compress_threshold = None
+    retry = None
+    replica = None
+    coalescer = None
+    validators = None
+    decodepool = None
+
+    def __init__(self, uri,
+                 timeout=None,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 pool_block=False,
+                 keepalive=True,
+                 upload_format='tshpack',
+                 cache_size=None,
+                 cache_ttl=None,
+                 cache_dir=None,
+                 cache_dir_size=None,
+                 stream=False,
+                 metrics=False,
+                 catalog_ttl=None,
+                 compress_threshold=None,
+                 retry=None,
+                 replica=None,
+                 replica_ttl=60,
+                 coalesce=False,
+                 conditional=False,
+                 decode_processes=None,
+                 decode_threshold=1 << 20):
+        """Http client for a tshistory_rest instance.
+
+        All end points share one pooled keep-alive session.
+        `timeout` is either a number of seconds or a (connect,
+        read) tuple; `pool_maxsize` bounds the connections kept
+        per host (with `pool_block`, callers wait for a free one).
+
+        Series are uploaded in the binary `tshpack` format, unless
+        `upload_format` is 'json' or the server turns out not to
+        support it.
+
+        With `cache_size` (in bytes), the series read through `get`
+        are kept in an LRU cache (`.cache`): the reads at a past
+        revision date are cached until evicted and, if `cache_ttl` is
+        given, the latest states are cached for `cache_ttl` seconds.
+        Writes made through the client invalidate the series entries.
 
-    def __init__(self, uri):
+        With `cache_dir`, the immutable reads (`get` at a past
+        revision date, `history` up to a past insertion date) are also
+        stored in a `DiskCache` in this directory (bounded to
+        `cache_dir_size` bytes if given), which can be shared by
+        several processes. The deletions and renamings made by
+        another process are not seen by its entries.
+
+        With `stream`, the `get` and `staircase` responses are
+        decoded while being received: the peak memory is then close
+        to the size of the decoded series rather than the compressed
+        plus decompressed plus decoded sizes.
+
+        With `metrics`, the requests are aggregated by a `Metrics`
+        listener (`.metrics`), see `add_listener`.
+
+        With `catalog_ttl` (in seconds), the catalog is held in a
+        `CatalogIndex` (see `catalog_index`) refreshed after this
+        delay. It serves `catalog` and `exists`, and is amended by the
+        writes made through the client.
+
+        With `compress_threshold` (in bytes), the larger form request
+        bodies are sent gzip compressed (`Content-Encoding: gzip`),
+        provided the server (or a proxy in front of it) decodes them:
+        on a first failure, they are sent plain from then on. The
+        binary (`tshpack`) uploads, being compressed already, are left
+        alone. Compressed responses are accepted anyway.
+
+        With `retry` (True or a `RetryPolicy`), the transient failures
+        are retried, as far as it is safe (see `RetryPolicy`). The
+        unexpected answers of the server raise `UnexpectedStatus` (or
+        `ServerError`, for the 5xx).
+
+        With `replica` (a list of names, a name pattern or a predicate
+        over the names), the selected series are mirrored locally by a
+        `Replica` (`.replica`) which serves their `get`, `staircase`
+        and `history` reads, and downloads the new revisions at most
+        every `replica_ttl` seconds.
+
+        With `coalesce`, the concurrent identical reads (`get`,
+        `staircase`, `history`, `metadata`, `catalog`) share one http
+        call and its decoded result, see `Coalescer` (`.coalescer`).
+
+        With `conditional`, the latest states read through `get` and
+        `staircase` are kept with their validators (`.validators`),
+        when the server gives some: reading them again is a
+        conditional request, answered without a body if nothing
+        changed. Otherwise they are read as usual.
+
+        With `decode_processes` (a number, or True for one per cpu),
+        the `get`, `staircase` and `history` payloads of at least
+        `decode_threshold` bytes are decoded in a `DecodePool` of
+        processes (`.decodepool`), for the batch fetches not to be
+        serialized on the GIL (without `stream`). The workers are
+        spawned, i.e. they import the main module: a script using
+        them must guard its entry point with `if __name__ ==
+        '__main__':` (and code read from stdin cannot use them).
+        """
+        assert upload_format in ('tshpack', 'json')
         self.uri = uri
+        self.timeout = timeout
+        self.upload_format = upload_format
+        self.pool_maxsize = pool_maxsize
+        self.stream = stream
+        if cache_size:
+            self.cache = SeriesCache(cache_size, cache_ttl)
+        if cache_dir:
+            self.diskcache = DiskCache(cache_dir, cache_dir_size)
+        # name -> (series, insertion date cursor)
+        self._synced = {}
+        self.catalog_ttl = catalog_ttl
+        self.compress_threshold = compress_threshold
+        if retry is True:
+            retry = RetryPolicy()
+        self.retry = retry or None
+        if replica is not None:
+            self.replica = Replica(self, replica, ttl=replica_ttl)
+        if coalesce:
+            self.coalescer = Coalescer()
+        if conditional:
+            self.validators = Validators()
+        if decode_processes:
+            self.decodepool = DecodePool(
+                None if decode_processes is True else decode_processes,
+                decode_threshold
+            )
+        self._catalog = None
+        self._mainsource = None
+        self._catalog_lock = threading.Lock()
+        if metrics:
+            self.metrics = Metrics()
+            self.add_listener(self.metrics)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if not keepalive:
+            self.session.headers['Connection'] = 'close'
 
     def __repr__(self):
         return f"tshistory-http-client(uri='{self.uri}')"
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+        if self.decodepool is not None:
+            self.decodepool.close()
+
+    def add_listener(self, listener):
+        """Register a callable to be called with an event (a dict) for
+        each http request made by the client.
+
+        The event items are: method, endpoint (the url path), name
+        (of the series, if any), status (None if the request failed
+        without a response), sent and received (body bytes on the
+        wire), sent_uncompressed and received_uncompressed (the same,
+        before compression), http_time (until the response headers or,
+        when the response is not streamed, its full body are received)
+        and decode_time (spent reading and decoding the body
+        afterwards), in seconds.
+
+        Listeners are called synchronously, from the thread making
+        the request: they had better be fast. Without listeners,
+        nothing is measured.
+        """
+        self.listeners = self.listeners + (listener,)
+
+    def remove_listener(self, listener):
+        self.listeners = tuple(
+            l for l in self.listeners if l != listener
+        )
+
+    def _emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    def _send(self, method, url, **kw):
+        # send the request, its body gzip compressed if it is large
+        # enough, and return the response and the plain body size
+        # (None when sent as is)
+        if (self.compress_threshold is None or
+            'files' in kw or
+            not kw.get('data')):
+            return self.session.request(method, url, **kw), None
+
+        timeout = kw.pop('timeout')
+        stream = kw.pop('stream', False)
+        prep = self.session.prepare_request(
+            requests.Request(method, url, **kw)
+        )
+        body = prep.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        settings = self.session.merge_environment_settings(
+            prep.url, {}, stream, None, None
+        )
+        if len(body) < self.compress_threshold:
+            return self.session.send(prep, timeout=timeout, **settings), None
+
+        prep.body = gzip.compress(body, compresslevel=6)
+        prep.headers['Content-Encoding'] = 'gzip'
+        prep.prepare_content_length(prep.body)
+        res = self.session.send(prep, timeout=timeout, **settings)
+        if res.status_code not in (400, 415):
+            return res, len(body)
+
+        # maybe the server does not understand compressed bodies
+        prep.body = body
+        del prep.headers['Content-Encoding']
+        prep.prepare_content_length(body)
+        res = self.session.send(prep, timeout=timeout, **settings)
+        if res.status_code not in (400, 415):
+            # indeed: stop compressing
+            self.compress_threshold = None
+        return res, None
+
+    def _retried(self, method, path, url, **kw):
+        # send, retrying the transient failures as the policy allows
+        policy = self.retry
+        if policy is None:
+            return self._send(method, url, **kw)
+        policy.started()
+        attempt = 0
+        while True:
+            retryafter = None
+            try:
+                res, plainsize = self._send(method, url, **kw)
+            except requests.RequestException as err:
+                if not policy.allows(method, path, attempt, error=err):
+                    raise
+            else:
+                if not policy.allows(
+                        method, path, attempt, status=res.status_code):
+                    return res, plainsize
+                retryafter = res.headers.get('Retry-After')
+                res.close()
+            time.sleep(policy.delay(attempt, retryafter))
+            attempt += 1
+
+    def _request(self, method, path, name=None, decoded=False, **kw):
+        # with `decoded`, the event is emitted by `_decoding`
+        kw.setdefault('timeout', self.timeout)
+        url = f'{self.uri}{path}'
+        if not self.listeners:
+            return self._retried(method, path, url, **kw)[0]
+
+        event = {
+            'method': method.upper(),
+            'endpoint': path,
+            'name': name,
+            'status': None,
+            'sent': 0,
+            'received': 0,
+            'sent_uncompressed': 0,
+            'received_uncompressed': 0,
+            'http_time': 0.,
+            'decode_time': 0.
+        }
+        t0 = time.perf_counter()
+        try:
+            res, plainsize = self._retried(method, path, url, **kw)
+        except requests.RequestException:
+            event['http_time'] = time.perf_counter() - t0
+            self._emit(event)
+            raise
+        event['http_time'] = time.perf_counter() - t0
+        event['status'] = res.status_code
+        event['sent'] = len(res.request.body or b'')
+        event['sent_uncompressed'] = plainsize or event['sent']
+        if not kw.get('stream'):
+            event['received_uncompressed'] = len(res.content)
+            event['received'] = _wirebytes(res)
+        if decoded:
+            res.event = event
+        else:
+            self._emit(event)
+        return res
+
+    @contextmanager
+    def _decoding(self, res):
+        # time the reading and decoding of a response body and emit
+        # its event (yielded, None when there are no listeners)
+        event = getattr(res, 'event', None)
+        if event is None:
+            yield None
+            return
+        t0 = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event['decode_time'] += time.perf_counter() - t0
+            if not event['received']:
+                # streamed: count what was read
+                event['received'] = _wirebytes(res)
+            self._emit(event)
+
+    def _chunks(self, res, chunksize):
+        # iterate over a streamed response body, counting its size
+        event = getattr(res, 'event', None)
+        for chunk in res.iter_content(chunksize):
+            if event is not None:
+                event['received_uncompressed'] += len(chunk)
+            yield chunk
+
+    def _batch(self, func, items, max_workers=None):
+        # run func over the distinct items in a thread pool sized
+        # after the connection pool by default
+        result = BatchResult()
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers or self.pool_maxsize) as pool:
+            futures = {
+                item: pool.submit(func, item)
+                for item in dict.fromkeys(items)
+            }
+        for item, future in futures.items():
+            try:
+                result[item] = future.result()
+            except Exception as err:
+                result.errors[item] = err
+        result.elapsed = time.perf_counter() - t0
+        if result.elapsed:
+            result.throughput = len(futures) / result.elapsed
+        return result
+
+    def _coalesced(self, key, func):
+        # the identical reads in flight share one call
+        if self.coalescer is None:
+            return func()
+        return self.coalescer.do(key, func)
+
+    def _readseries(self, name, path, args, conditional=True):
+        return self._coalesced(
+            (path, conditional, tuple(sorted(args.items()))),
+            lambda: self._fetchseries(name, path, args, conditional)
+        )
+
+    def _fetchseries(self, name, path, args, conditional=True):
+        # the latest states are revalidated rather than read again
+        key = None
+        headers = {}
+        if (conditional and self.validators is not None and
+            'insertion_date' not in args):
+            key = (path, name, tuple(sorted(args.items())))
+            headers = self.validators.headers(key)
+        res = self._request(
+            'get', path,
+            name=name,
+            decoded=True,
+            params=args,
+            stream=self.stream,
+            headers=headers
+        )
+        with res, self._decoding(res):
+            if res.status_code == 404:
+                return None
+            if res.status_code == 304 and headers:
+                series = self.validators.reuse(key)
+                if series is not None:
+                    return series
+                # dropped meanwhile
+                return self._fetchseries(name, path, args, conditional)
+            _check(res, 200)
+
+            if self.stream:
+                series = _decodeseries(name, self._chunks(res, 1 << 20))
+            elif self.decodepool is not None:
+                series = self.decodepool.series(name, res.content)
+            else:
+                series = decodeseries(name, res.content)
+        if key is not None and self.validators.update(key, res, series):
+            # the held one is not to be touched
+            return series.copy()
+        return series
+
+    def _invalidate(self, name):
+        if self.cache is not None:
+            self.cache.invalidate(name)
+        if self.diskcache is not None:
+            self.diskcache.invalidate(name)
+        if self.replica is not None:
+            self.replica.invalidate(name)
+        if self.validators is not None:
+            self.validators.invalidate(name)
+
+    def _windowed(self, fetch, name, from_value_date, to_value_date, window):
+        # split the value dates range in windows fetched concurrently
+        start, stop = from_value_date, to_value_date
+        if start is None or stop is None:
+            try:
+                ival = self.interval(name)
+            except ValueError:
+                return fetch(from_value_date, to_value_date)
+            start = start or ival.left
+            stop = stop or ival.right
+
+        start = pd.Timestamp(strft(start))
+        stop = pd.Timestamp(strft(stop))
+        window = pd.Timedelta(window)
+        bounds = list(pd.date_range(start, stop, freq=window))
+        if len(bounds) < 2:
+            return fetch(from_value_date, to_value_date)
+        # the interval is the one of the latest state: the outer
+        # windows stay open for the points of the other revisions
+        uppers = [
+            lo - pd.Timedelta(microseconds=1)
+            for lo in bounds[1:]
+        ] + [None if to_value_date is None else stop]
+        if from_value_date is None:
+            bounds[0] = None
+        windows = list(zip(bounds, uppers))
+
+        pieces = self._batch(lambda bounds: fetch(*bounds), windows)
+        if pieces.errors:
+            raise next(iter(pieces.errors.values()))
+        pieces = [
+            piece for piece in pieces.values()
+            if piece is not None
+        ]
+        if not pieces:
+            return None
+        return pd.concat(pieces)
+
     def exists(self, name):
+        if self.catalog_ttl is not None:
+            return name in self.catalog_index()
         meta = self.metadata(name)
         if 'message' in meta and meta['message'].endswith('does not exists'):
             return False
         return True
 
+    def exists_many(self, names, max_workers=None):
+        """Tell concurrently whether several series exist.
+
+        Returns a `BatchResult` mapping each distinct name to a bool
+        (answered from the catalog index, in one go, when the client
+        has a `catalog_ttl`).
+        """
+        if self.catalog_ttl is not None:
+            index = self.catalog_index()
+            result = BatchResult()
+            result.update(
+                (name, name in index)
+                for name in names
+            )
+            return result
+        return self._batch(self.exists, names, max_workers)
+
     def _insert(self, name, series, author,
                 metadata=None, insertion_date=None,
                 replace=False):
-        qdata = {
-            'name': name,
-            'author': author,
-            'series': tojson(series),
-            'insertion_date': insertion_date.isoformat() if insertion_date else None,
-            'tzaware': tzaware_serie(series),
-            'replace': replace
-        }
-        if metadata:
-            qdata['metadata'] = json.dumps(metadata)
+        qdata = _insert_query(
+            name, series, author,
+            metadata=metadata,
+            insertion_date=insertion_date,
+            replace=replace
+        )
 
-        res = requests.patch(f'{self.uri}/series/state', data=qdata)
+        res = None
+        if self.upload_format == 'tshpack':
+            res = self._request(
+                'patch', '/series/state',
+                name=name,
+                data=dict(qdata, format='tshpack'),
+                files={'bseries': encodeseries(series)}
+            )
+            if res.status_code in (400, 415):
+                # maybe the server does not know about binary uploads
+                res = None
 
-        assert res.status_code in (200, 201, 405)
+        if res is None:
+            qdata['series'] = tojson(series)
+            res = self._request(
+                'patch', '/series/state', name=name, data=qdata
+            )
+            if (self.upload_format == 'tshpack' and
+                res.status_code not in (400, 415)):
+                # indeed: stick to json from now on
+                self.upload_format = 'json'
+        self._invalidate(name)
+
+        _check(res, 200, 201, 405)
         if res.status_code == 405:
             raise ValueError(res.json()['message'])
+        if res.status_code == 201:
+            self._catalogued('add', name, 'primary')
 
     def update(self, name, series, author, metadata=None, insertion_date=None):
         return self._insert(
@@ -89,66 +788,336 @@ class Client:
             replace=True
         )
 
+    def _insert_many(self, items, author,
+                     insertion_date=None,
+                     replace=False,
+                     max_workers=None):
+        byname = {}
+        for name, series, *metadata in items:
+            byname.setdefault(name, []).append(
+                (series, metadata[0] if metadata else None)
+            )
+
+        def insert(name):
+            # the writes of a given series are done in order
+            for written, (series, metadata) in enumerate(byname[name]):
+                try:
+                    self._insert(
+                        name, series, author,
+                        metadata=metadata,
+                        insertion_date=insertion_date,
+                        replace=replace
+                    )
+                except Exception as err:
+                    # where to resume the writes of this series
+                    err.written = written
+                    raise
+            return len(byname[name])
+
+        result = self._batch(insert, byname, max_workers)
+        if result.elapsed:
+            result.throughput = sum(result.values()) / result.elapsed
+        return result
+
+    def update_many(self, items, author,
+                    insertion_date=None,
+                    max_workers=None):
+        """Concurrently update many series.
+
+        `items` is an iterable of (name, series) or (name, series,
+        metadata) tuples. Writes to distinct series are pipelined
+        over the thread pool while the writes to the same series
+        keep their order (and stop at the first failure).
+
+        Returns a `BatchResult` mapping each name to its number of
+        written items, with per-name failures in `.errors`. A failure
+        tells in `.written` how many items of its series were written
+        before it (hence the index, among them, of the failing item).
+        """
+        return self._insert_many(
+            items, author,
+            insertion_date=insertion_date,
+            max_workers=max_workers
+        )
+
+    def replace_many(self, items, author,
+                     insertion_date=None,
+                     max_workers=None):
+        """Concurrently replace many series (see `update_many`)."""
+        return self._insert_many(
+            items, author,
+            insertion_date=insertion_date,
+            replace=True,
+            max_workers=max_workers
+        )
+
     def metadata(self, name, all=False):
-        res = requests.get(f'{self.uri}/series/metadata', params={
-            'name': name,
-            'all': int(all)
-        })
-        assert res.status_code in (200, 404)
+        return self._coalesced(
+            ('/series/metadata', name, all),
+            lambda: self._fetchmetadata(name, all)
+        )
+
+    def _fetchmetadata(self, name, all):
+        res = self._request(
+            'get', '/series/metadata', name=name, params={
+                'name': name,
+                'all': int(all)
+            }
+        )
+        _check(res, 200, 404)
         return res.json()
 
+    def metadata_many(self, names, all=False, max_workers=None):
+        """Concurrently fetch the metadata of several series (see
+        `get_many`).
+        """
+        return self._batch(
+            lambda name: self.metadata(name, all=all),
+            names,
+            max_workers
+        )
+
     def update_metadata(self, name, metadata):
         assert isinstance(metadata, dict)
-        res = requests.put(f'{self.uri}/series/metadata', data={
-            'name': name,
-            'metadata': json.dumps(metadata)
-        })
+        res = self._request(
+            'put', '/series/metadata', name=name, data={
+                'name': name,
+                'metadata': json.dumps(metadata)
+            }
+        )
+        _check(res, 200, 405)
+        if res.status_code == 405:
+            raise ValueError(res.json()['message'])
 
     def get(self, name,
             revision_date=None,
             from_value_date=None,
-            to_value_date=None):
-        args = {
-            'name': name,
-            'format': 'tshpack'
-        }
-        if revision_date:
-            args['insertion_date'] = strft(revision_date)
-        if from_value_date:
-            args['from_value_date'] = strft(from_value_date)
-        if to_value_date:
-            args['to_value_date'] = strft(to_value_date)
-        res = requests.get(
-            f'{self.uri}/series/state', params=args
-        )
-        if res.status_code == 404:
-            return None
-        res.raise_for_status()
-        assert res.status_code == 200
+            to_value_date=None,
+            window=None):
+        """Get the series state (at `revision_date` if given).
 
-        return decodeseries(name, res.content)
+        With `window` (a timedelta), the value dates range is split
+        into windows of this size, fetched concurrently and
+        concatenated. The range defaults to the series interval.
+        """
+        if self.replica is not None and name in self.replica:
+            return self.replica.get(
+                name,
+                revision_date=revision_date,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date
+            )
+        if window is not None:
+            return self._windowed(
+                lambda fromdate, todate: self.get(
+                    name,
+                    revision_date=revision_date,
+                    from_value_date=fromdate,
+                    to_value_date=todate
+                ),
+                name, from_value_date, to_value_date, window
+            )
 
-    def staircase(self, name, delta,
+        args = _state_query(
+            name,
+            revision_date=revision_date,
+            from_value_date=from_value_date,
+            to_value_date=to_value_date
+        )
+        # past revisions are immutable
+        immutable = bool(revision_date) and _ispast(revision_date)
+        key = ('get', name, tuple(sorted(args.items())))
+        # only the reads which could have been put there are looked up
+        cached = self.cache is not None and (immutable or self.cache.ttl)
+        if cached:
+            series = self.cache.get(key)
+            if series is not None:
+                return series.copy()
+
+        series = None
+        if immutable and self.diskcache is not None:
+            series = self.diskcache.getseries(name, (self.uri,) + key)
+
+        if series is None:
+            series = self._readseries(name, '/series/state', args)
+            if series is None:
+                return None
+            if immutable and self.diskcache is not None:
+                self.diskcache.putseries(name, (self.uri,) + key, series)
+
+        if cached:
+            if immutable:
+                self.cache.put(key, series)
+            else:
+                self.cache.put(key, series, ttl=self.cache.ttl)
+            series = series.copy()
+        return series
+
+    def get_many(self, names,
+                 revision_date=None,
+                 from_value_date=None,
+                 to_value_date=None,
+                 max_workers=None):
+        """Concurrently fetch several series.
+
+        Returns a `BatchResult` mapping each name to its series (None
+        for unknown series), failures being reported in `.errors`.
+        """
+        return self._batch(
+            lambda name: self.get(
+                name,
+                revision_date=revision_date,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date
+            ),
+            names,
+            max_workers
+        )
+
+    def get_frame(self, names,
+                  revision_date=None,
                   from_value_date=None,
-                  to_value_date=None):
-        args = {
-            'name': name,
-            'delta': delta,
-            'format': 'tshpack'
-        }
-        if from_value_date:
-            args['from_value_date'] = strft(from_value_date)
-        if to_value_date:
-            args['to_value_date'] = strft(to_value_date)
-        res = requests.get(
-            f'{self.uri}/series/staircase', params=args
-        )
-        if res.status_code == 404:
+                  to_value_date=None,
+                  max_workers=None):
+        """Fetch several series concurrently and align them in a
+        dataframe with one column per known series (in the order of
+        `names`).
+
+        The union index is computed once and the columns are written
+        in place (see `util.alignframe`), which is cheaper than
+        concatenating the series. The first failure is raised, as is
+        a ValueError when tz-aware and naive series are mixed.
+        """
+        names = list(dict.fromkeys(names))
+        res = self.get_many(
+            names,
+            revision_date=revision_date,
+            from_value_date=from_value_date,
+            to_value_date=to_value_date,
+            max_workers=max_workers
+        )
+        if res.errors:
+            raise next(iter(res.errors.values()))
+        return alignframe({
+            name: res[name]
+            for name in names
+            if res[name] is not None
+        })
+
+    def sync(self, name, skew=pd.Timedelta(minutes=1)):
+        """Return the latest state of a series, downloading only what
+        changed since the previous call.
+
+        The first call fetches the full series. The next ones ask for
+        the diffs of the revisions inserted since then and apply them
+        to the locally held series, hence the transfer and decoding
+        costs follow the size of the changes rather than the size of
+        the series.
+
+        `skew` is a safety margin for the clock difference between
+        the client and the server (applying a diff twice is harmless).
+        """
+        known = self._synced.get(name)
+        if known is None:
+            cursor = pd.Timestamp.now(tz='UTC') - skew
+            # from the server: a cached state may predate the cursor
+            series = self._readseries(
+                name, '/series/state', _state_query(name),
+                conditional=False
+            )
+        else:
+            series, cursor = known
+            diffs = self.history(
+                name,
+                from_insertion_date=cursor,
+                diffmode=True,
+                _keep_nans=True
+            )
+            if diffs is not None:
+                for idate, diff in diffs.items():
+                    series = _patch(series, diff)
+                    cursor = idate + pd.Timedelta(microseconds=1)
+            else:
+                series = None
+
+        if series is None:
+            self._synced.pop(name, None)
             return None
-        res.raise_for_status()
-        assert res.status_code == 200
+        self._synced[name] = (series, cursor)
+        return series.copy()
 
-        return decodeseries(name, res.content)
+    def staircase(self, name, delta,
+                  from_value_date=None,
+                  to_value_date=None,
+                  window=None):
+        """Get the series built from the values known `delta` before
+        their value date (the `window` option works as with `get`).
+        """
+        if self.replica is not None and name in self.replica:
+            return self.replica.staircase(
+                name, delta,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date
+            )
+        if window is not None:
+            return self._windowed(
+                lambda fromdate, todate: self.staircase(
+                    name, delta,
+                    from_value_date=fromdate,
+                    to_value_date=todate
+                ),
+                name, from_value_date, to_value_date, window
+            )
+
+        args = _staircase_query(
+            name, delta,
+            from_value_date=from_value_date,
+            to_value_date=to_value_date
+        )
+        return self._readseries(name, '/series/staircase', args)
+
+    def staircase_many(self, name, deltas,
+                       from_value_date=None,
+                       to_value_date=None,
+                       method='parallel'):
+        """Get the staircase series of several deltas, as a {delta:
+        series} dict (None for an unknown series).
+
+        With method 'parallel' (the default), they are fetched
+        concurrently with `staircase`. With 'history', they are
+        computed locally from a single download of the history diffs
+        (see `util.staircases`): it pays off for several deltas over
+        a short history, whereas a long one costs more to transfer
+        than a few staircases.
+        """
+        assert method in ('history', 'parallel')
+        deltas = list(dict.fromkeys(deltas))
+
+        if method == 'parallel':
+            res = self._batch(
+                lambda delta: self.staircase(
+                    name, delta,
+                    from_value_date=from_value_date,
+                    to_value_date=to_value_date
+                ),
+                deltas
+            )
+            if res.errors:
+                raise next(iter(res.errors.values()))
+            if any(series is None for series in res.values()):
+                return None
+            return {delta: res[delta] for delta in deltas}
+
+        hist = self.history(
+            name,
+            from_value_date=from_value_date,
+            to_value_date=to_value_date,
+            diffmode=True,
+            _keep_nans=True
+        )
+        if hist is None:
+            return None
+        return staircases(hist, deltas, name)
 
     def history(self, name,
                 from_insertion_date=None,
@@ -156,89 +1125,279 @@ class Client:
                 from_value_date=None,
                 to_value_date=None,
                 diffmode=False,
-                _keep_nans=False):
-        args = {
-            'name': name,
-            'format': 'tshpack',
-            'diffmode': json.dumps(diffmode),
-            '_keep_nans': json.dumps(_keep_nans)
-        }
-        if from_insertion_date:
-            args['from_insertion_date'] = strft(from_insertion_date)
-        if to_insertion_date:
-            args['to_insertion_date'] = strft(to_insertion_date)
-        if from_value_date:
-            args['from_value_date'] = strft(from_value_date)
-        if to_value_date:
-            args['to_value_date'] = strft(to_value_date)
-        res = requests.get(
-            f'{self.uri}/series/history', params=args
-        )
-        if res.status_code == 404:
-            return None
-        res.raise_for_status()
-        assert res.status_code == 200
+                _keep_nans=False,
+                columnar=False):
+        """Get the history of a series, as an {insertion date: series}
+        dict of its revisions (or of their diffs, with `diffmode`).
+
+        With `columnar`, it comes as a `History`: the revisions are
+        stored as diffs in flat arrays (full revisions being diffed
+        while the response is received) with vectorized lookups and
+        revision analytics, at a fraction of the memory of the dict.
+        """
+        if self.replica is not None and name in self.replica:
+            return self.replica.history(
+                name,
+                from_insertion_date=from_insertion_date,
+                to_insertion_date=to_insertion_date,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date,
+                diffmode=diffmode,
+                _keep_nans=_keep_nans,
+                columnar=columnar
+            )
+        if columnar:
+            return self._columnarhistory(
+                name,
+                from_insertion_date=from_insertion_date,
+                to_insertion_date=to_insertion_date,
+                from_value_date=from_value_date,
+                to_value_date=to_value_date,
+                diffmode=diffmode,
+                _keep_nans=_keep_nans
+            )
+
+        args = _history_query(
+            name,
+            from_insertion_date=from_insertion_date,
+            to_insertion_date=to_insertion_date,
+            from_value_date=from_value_date,
+            to_value_date=to_value_date,
+            diffmode=diffmode,
+            _keep_nans=_keep_nans
+        )
+        key = None
+        if (self.diskcache is not None and
+            to_insertion_date and _ispast(to_insertion_date)):
+            key = (self.uri, 'history', name, tuple(sorted(args.items())))
+            hist = self.diskcache.gethistory(name, key)
+            if hist is not None:
+                return hist
 
-        _meta, hist = unpack_history(res.content)
-        for series in hist.values():
-            series.name = name
+        hist = self._coalesced(
+            ('/series/history', tuple(sorted(args.items()))),
+            lambda: self._fetchhistory(name, args)
+        )
+        if hist is not None and key is not None:
+            self.diskcache.puthistory(name, key, hist)
         return hist
 
+    def _fetchhistory(self, name, args):
+        res = self._request(
+            'get', '/series/history',
+            name=name,
+            decoded=True,
+            params=args
+        )
+        with self._decoding(res):
+            if res.status_code == 404:
+                return None
+            _check(res, 200)
+
+            if self.decodepool is not None:
+                return self.decodepool.history(name, res.content)
+            return _decodehistory(name, res.content)
+
+    def _columnarhistory(self, name, diffmode=False, **kw):
+        args = _history_query(name, diffmode=diffmode, **kw)
+        return self._coalesced(
+            ('/series/history', 'columnar', tuple(sorted(args.items()))),
+            lambda: self._fetchcolumnar(name, args, diffmode)
+        )
+
+    def _fetchcolumnar(self, name, args, diffmode):
+        res = self._request(
+            'get', '/series/history',
+            name=name,
+            decoded=True,
+            params=args,
+            stream=True
+        )
+        with res, self._decoding(res):
+            if res.status_code == 404:
+                return None
+            _check(res, 200)
+
+            return History.fromchunks(
+                name, self._chunks(res, 1 << 20), diffmode=diffmode
+            )
+
+    def iter_history(self, name,
+                     from_insertion_date=None,
+                     to_insertion_date=None,
+                     from_value_date=None,
+                     to_value_date=None,
+                     diffmode=False,
+                     _keep_nans=False,
+                     chunksize=1 << 20):
+        """Iterate over the (insertion date, series) pairs of the
+        history of a series.
+
+        The response is streamed and decoded revision by revision,
+        so that the memory use is bounded by the size of the largest
+        revision rather than the size of the whole history.
+        """
+        args = _history_query(
+            name,
+            from_insertion_date=from_insertion_date,
+            to_insertion_date=to_insertion_date,
+            from_value_date=from_value_date,
+            to_value_date=to_value_date,
+            diffmode=diffmode,
+            _keep_nans=_keep_nans
+        )
+        res = self._request(
+            'get', '/series/history',
+            name=name,
+            decoded=True,
+            params=args,
+            stream=True
+        )
+        with res, self._decoding(res) as event:
+            if res.status_code == 404:
+                return
+            _check(res, 200)
+
+            for item in _iterhistory(name, self._chunks(res, chunksize)):
+                if event is None:
+                    yield item
+                    continue
+                # the time spent by the consumer is not decoding time
+                t0 = time.perf_counter()
+                yield item
+                event['decode_time'] -= time.perf_counter() - t0
+
+    def fold_history(self, name, func, initial=None, **kw):
+        """Fold the revisions of a series into an aggregate, with
+        `func(aggregate, insertion_date, series)`, without ever
+        holding the whole history (see `iter_history`).
+        """
+        aggregate = initial
+        for idate, series in self.iter_history(name, **kw):
+            aggregate = func(aggregate, idate, series)
+        return aggregate
+
     def type(self, name):
-        res = requests.get(f'{self.uri}/series/metadata', params={
-            'name': name,
-            'type': 'type'
-        })
-        assert res.status_code in (200, 404)
+        res = self._request(
+            'get', '/series/metadata', name=name, params={
+                'name': name,
+                'type': 'type'
+            }
+        )
+        _check(res, 200, 404)
         if res.status_code == 200:
             return res.json()
 
     def interval(self, name):
-        res = requests.get(f'{self.uri}/series/metadata', params={
-            'name': name,
-            'type': 'interval'
-        })
-        assert res.status_code in (200, 204, 404)
+        res = self._request(
+            'get', '/series/metadata', name=name, params={
+                'name': name,
+                'type': 'interval'
+            }
+        )
+        _check(res, 200, 204, 404)
         if res.status_code == 200:
-            tzaware, left, right = res.json()
-            tz = 'utc' if tzaware else None
-            return pd.Interval(
-                pd.Timestamp(left, tz=tz),
-                pd.Timestamp(right, tz=tz),
-                closed='both'
-            )
+            return _decodeinterval(res.json())
         raise ValueError(f'no interval for series: {name}')
 
+    def interval_many(self, names, max_workers=None):
+        """Concurrently fetch the intervals of several series, the
+        series without interval being reported in `.errors` (see
+        `get_many`).
+        """
+        return self._batch(self.interval, names, max_workers)
+
+    def _fetchcatalog(self, allsources):
+        return self._coalesced(
+            ('/series/catalog', allsources),
+            lambda: self._readcatalog(allsources)
+        )
+
+    def _readcatalog(self, allsources):
+        res = self._request(
+            'get', '/series/catalog', params={
+                'allsources': allsources
+            }
+        )
+        _check(res, 200)
+
+        return _decodecatalog(res.json())
+
     def catalog(self, allsources=True):
-        res = requests.get(f'{self.uri}/series/catalog', params={
-            'allsources': allsources
-        })
-        assert res.status_code == 200
+        if self.catalog_ttl is not None and allsources:
+            return self.catalog_index().catalog()
+        return self._fetchcatalog(allsources)
 
-        return {
-            tuple(k.split('!')): v
-            for k, v in res.json().items()
-        }
+    def catalog_index(self, refresh=False):
+        """Return the `CatalogIndex` of all the sources, fetched
+        if there is none yet, if it is older than `catalog_ttl` or if
+        `refresh` is asked.
+        """
+        with self._catalog_lock:
+            index = self._catalog
+            if (refresh or index is None or
+                self.catalog_ttl is None or
+                index.age() > self.catalog_ttl):
+                index = CatalogIndex(self._fetchcatalog(True))
+                if self.catalog_ttl is not None:
+                    self._catalog = index
+            return index
+
+    def _source(self, index):
+        # the source written to by the client (learnt once, from the
+        # main source catalog, which also refreshes its entries)
+        if self._mainsource is None:
+            main = self._fetchcatalog(False)
+            if len(main) != 1:
+                return None
+            [(self._mainsource, items)] = main.items()
+            index.setsource(self._mainsource, items)
+        return self._mainsource
+
+    def _catalogued(self, action, *args):
+        # keep the catalog index in line with a write of ours
+        # (action: add, rename or remove)
+        index = self._catalog
+        if index is None:
+            return
+        with self._catalog_lock:
+            source = self._source(index)
+        if source is None:
+            # no telling where the write went
+            self._catalog = None
+            return
+        getattr(index, action)(source, *args)
 
     def rename(self, oldname, newname):
-        res = requests.put(
-            f'{self.uri}/series/state',
+        res = self._request(
+            'put', '/series/state',
+            name=oldname,
             data={'name': oldname, 'newname': newname}
         )
-        assert res.status_code == 204
+        self._invalidate(oldname)
+        self._invalidate(newname)
+        _check(res, 204)
+        if self.replica is not None:
+            self.replica.drop(oldname)
+        self._catalogued('rename', oldname, newname)
 
     def delete(self, name):
-        res = requests.delete(
-            f'{self.uri}/series/state',
+        res = self._request(
+            'delete', '/series/state',
+            name=name,
             data={'name': name}
         )
-        assert res.status_code == 204
+        self._invalidate(name)
+        _check(res, 204)
+        if self.replica is not None:
+            self.replica.drop(name)
+        self._catalogued('remove', name)
 
     # formula
 
     def formula(self, name):
-        res = requests.get(
-            f'{self.uri}/series/formula', params={
+        res = self._request(
+            'get', '/series/formula', name=name, params={
                 'name': name
             }
         )
@@ -250,8 +1409,8 @@ class Client:
                          formula,
                          reject_unknown=True,
                          update=False):
-        res = requests.patch(
-            f'{self.uri}/series/formula', data={
+        res = self._request(
+            'patch', '/series/formula', name=name, data={
                 'name': name,
                 'text': formula,
                 'reject_unknown': reject_unknown,
@@ -267,4 +1426,6 @@ class Client:
             elif 'exists' in msg:
                 raise AssertionError(msg)
 
+        if res.status_code in (200, 201):
+            self._catalogued('add', name, 'formula')
         return res.json()
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class SeriesCache:
+    """Thread-safe LRU cache of decoded series, bounded by the memory
+    footprint of its content (in bytes).
+
+    Entries put with a `ttl` (in seconds) expire, the others stay
+    until evicted or invalidated.
+    """
+
+    def __init__(self, maxbytes, ttl=None):
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (series, nbytes, expiry date)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (
+            f'<SeriesCache {len(self)} entries, '
+            f'{self.nbytes}/{self.maxbytes} bytes>'
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                series, _, expiry = entry
+                if expiry is None or expiry > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return series
+                self._drop(key)
+            self.misses += 1
+
+    def put(self, key, series, ttl=None):
+        nbytes = int(series.memory_usage(index=True, deep=True))
+        if nbytes > self.maxbytes:
+            return
+        expiry = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (series, nbytes, expiry)
+            self.nbytes += nbytes
+            while self.nbytes > self.maxbytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, name=None):
+        """Drop the entries of the given series (keys are expected to
+        be tuples with the series name in second position), or all of
+        them.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if name is None or key[1] == name:
+                    self._drop(key)
+
+    def _drop(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self.nbytes -= nbytes
@@ -0,0 +1,95 @@
+from bisect import bisect_left
+import threading
+import time
+
+
+class CatalogIndex:
+    """Indexed catalog: name lookup and prefix search over the series
+    of all the sources.
+
+    It is built from a catalog as returned by `Client.catalog`
+    ({(uri, namespace): [[name, kind], ...]}) and can be amended in
+    place as series are created, renamed or deleted.
+    """
+
+    def __init__(self, catalog):
+        # source -> {name: kind}, in the catalog order
+        self.sources = {
+            source: {name: kind for name, kind in items}
+            for source, items in catalog.items()
+        }
+        self.built = time.monotonic()
+        self._lock = threading.Lock()
+        self._names = None
+
+    def __len__(self):
+        return len(self.names())
+
+    def __contains__(self, name):
+        return self.lookup(name) is not None
+
+    def __repr__(self):
+        return f'<CatalogIndex {len(self.sources)} sources>'
+
+    def age(self):
+        return time.monotonic() - self.built
+
+    def lookup(self, name):
+        """Return the (source, kind) of a series, or None."""
+        with self._lock:
+            for source, names in self.sources.items():
+                kind = names.get(name)
+                if kind is not None:
+                    return source, kind
+
+    def names(self):
+        """The sorted names of all the series."""
+        with self._lock:
+            if self._names is None:
+                self._names = sorted(
+                    set().union(*self.sources.values())
+                )
+            return self._names
+
+    def search(self, prefix):
+        """Return the sorted names starting with `prefix`."""
+        names = self.names()
+        found = []
+        for pos in range(bisect_left(names, prefix), len(names)):
+            if not names[pos].startswith(prefix):
+                break
+            found.append(names[pos])
+        return found
+
+    def catalog(self):
+        with self._lock:
+            return {
+                source: [[name, kind] for name, kind in names.items()]
+                for source, names in self.sources.items()
+            }
+
+    # local amendments
+
+    def setsource(self, source, items):
+        with self._lock:
+            self.sources[source] = {name: kind for name, kind in items}
+            self._names = None
+
+    def add(self, source, name, kind):
+        with self._lock:
+            names = self.sources.setdefault(source, {})
+            if names.get(name) != kind:
+                names[name] = kind
+                self._names = None
+
+    def remove(self, source, name):
+        with self._lock:
+            self.sources.get(source, {}).pop(name, None)
+            self._names = None
+
+    def rename(self, source, oldname, newname):
+        with self._lock:
+            names = self.sources.get(source, {})
+            if oldname in names:
+                names[newname] = names.pop(oldname)
+                self._names = None
@@ -0,0 +1,72 @@
+import copy
+import threading
+
+
+class _flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class Coalescer:
+    """Single-flight deduplication of concurrent identical reads.
+
+    While a call is in flight for a key, the other callers asking for
+    the same key wait for it and share its outcome (its result, or
+    its exception) instead of making their own call. They get deep
+    copies of the result, so that nobody sees the changes made by
+    the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> in flight call
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __repr__(self):
+        return f'<Coalescer {len(self._flights)} in flight>'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights)
+            }
+
+    def do(self, key, func):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _flight()
+                self.calls += 1
+                leader = True
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = func()
+        except BaseException as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        if flight.waiters:
+            # the original stays untouched for the waiters to copy
+            return copy.deepcopy(flight.result)
+        return flight.result
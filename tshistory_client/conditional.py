@@ -0,0 +1,80 @@
+import threading
+
+
+class Validators:
+    """Validators (`ETag`, `Last-Modified`) of the latest series
+    reads, held along with the decoded series, for conditional
+    requests.
+
+    A read made again is sent with `If-None-Match` (or
+    `If-Modified-Since`, when the server only gives a modification
+    date): on a "304 Not Modified" answer, the held series is reused
+    and nothing is transferred nor decoded. The answers without
+    validators are not held, hence a server ignoring them is simply
+    queried as usual.
+
+    Entries are keyed by query (tuples with the series name in second
+    position) and dropped on the writes made through the client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (conditional headers, series)
+        self._entries = {}
+        self.revalidated = 0
+        self.modified = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f'<Validators {len(self)} entries>'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'revalidated': self.revalidated,
+                'modified': self.modified
+            }
+
+    def headers(self, key):
+        """The conditional headers of a query (none if unknown)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return {}
+        return entry[0]
+
+    def reuse(self, key):
+        """A copy of the held series of a query, known unchanged."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.revalidated += 1
+        return entry[1].copy()
+
+    def update(self, key, res, series):
+        """Hold the series read with a response, if it came with
+        validators (and tell so).
+        """
+        etag = res.headers.get('ETag')
+        lastmodified = res.headers.get('Last-Modified')
+        with self._lock:
+            if etag:
+                self._entries[key] = ({'If-None-Match': etag}, series)
+            elif lastmodified:
+                self._entries[key] = (
+                    {'If-Modified-Since': lastmodified}, series
+                )
+            else:
+                self._entries.pop(key, None)
+                return False
+            self.modified += 1
+        return True
+
+    def invalidate(self, name=None):
+        with self._lock:
+            for key in list(self._entries):
+                if name is None or key[1] == name:
+                    del self._entries[key]
@@ -0,0 +1,158 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import os
+import struct
+import threading
+
+import numpy as np
+import pandas as pd
+
+from tshistory_client.util import (
+    _inflate,
+    _reader,
+    frombuffers,
+    iter_nary
+)
+
+
+def _layout(sizes):
+    # the items offsets, aligned on 8 bytes so that the int64 and
+    # float64 arrays can be viewed in place
+    offsets = []
+    total = 0
+    for size in sizes:
+        offsets.append(total)
+        total += (size + 7) & ~7
+    return offsets, total
+
+
+def _inflateshared(payload):
+    # in a worker: inflate a nary payload straight into a new shared
+    # memory block, left for the parent to unlink
+    reader = _reader(_inflate([payload], 1 << 20))
+    [count] = struct.unpack('!L', reader.readinto(bytearray(4)))
+    sizes = struct.unpack(f'!{count}L', reader.readinto(bytearray(4 * count)))
+    offsets, total = _layout(sizes)
+    shm = SharedMemory(create=True, size=max(total, 1))
+    try:
+        for offset, size in zip(offsets, sizes):
+            reader.readinto(shm.buf[offset:offset + size])
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, sizes
+
+
+class _segment:
+    # owner of the mapping of a shared memory block, exposing it to
+    # numpy: the arrays viewing it keep it alive, and the last one to
+    # go unmaps it
+
+    def __init__(self, shm, size):
+        self.shm = shm
+        self.array = np.frombuffer(shm.buf, dtype=np.uint8, count=size)
+        self.__array_interface__ = self.array.__array_interface__
+
+    def __del__(self):
+        self.array = None
+        self.shm.close()
+
+
+class DecodePool:
+    """Process pool decoding the large series and history payloads
+    outside of the GIL.
+
+    The payloads of at least `threshold` (compressed) bytes are sent
+    to one of the `processes` workers, which inflates them into a
+    shared memory block: the parent builds the series right over it
+    (no pickling nor copy of the decoded data). The block is unlinked
+    at once and unmapped with the last array using it. The smaller
+    ones are decoded inline, where the round trip to a worker would
+    cost more than the decoding itself.
+
+    The workers are started with the 'spawn' method (no fork of a
+    threaded process): the main module of the program must be
+    importable without side effects, i.e. guarded with `if __name__
+    == '__main__':`.
+    """
+
+    def __init__(self, processes=None, threshold=1 << 20):
+        self.processes = processes or os.cpu_count()
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._pool = None
+        self.inline = 0
+        self.offloaded = 0
+
+    def __repr__(self):
+        return f'<DecodePool {self.processes} processes>'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inline': self.inline,
+                'offloaded': self.offloaded
+            }
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # no fork of a (maybe threaded) client process
+                self._pool = ProcessPoolExecutor(
+                    self.processes,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _items(self, payload):
+        # the nary items of a payload, as numpy uint8 buffers
+        if len(payload) < self.threshold:
+            with self._lock:
+                self.inline += 1
+            return list(iter_nary([payload]))
+
+        name, sizes = self._executor().submit(
+            _inflateshared, payload
+        ).result()
+        shm = SharedMemory(name=name)
+        # the mapping outlives the name
+        shm.unlink()
+        offsets, total = _layout(sizes)
+        data = np.asarray(_segment(shm, total))
+        with self._lock:
+            self.offloaded += 1
+        return [
+            data[offset:offset + size]
+            for offset, size in zip(offsets, sizes)
+        ]
+
+    def series(self, name, payload):
+        """Decode a series payload (see `decodeseries`)."""
+        bmeta, bindex, bvalues = self._items(payload)
+        series = frombuffers(bindex, bvalues, json.loads(bmeta.tobytes()))
+        series.name = name
+        return series
+
+    def history(self, name, payload):
+        """Decode a history payload, as an {insertion date: series}
+        dict.
+        """
+        items = iter(self._items(payload))
+        meta = json.loads(next(items).tobytes())
+        idates = next(items).view('<i8')
+        hist = {}
+        for idate, bindex, bvalues in zip(idates, items, items):
+            series = frombuffers(bindex, bvalues, meta)
+            series.name = name
+            hist[pd.Timestamp(idate, tz='UTC')] = series
+        return hist
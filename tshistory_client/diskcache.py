@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from tshistory.util import tzaware_serie
+
+from tshistory_client.util import datetimeindex
+
+
+class DiskCache:
+    """On-disk cache of decoded series and histories, which can be
+    shared by several processes.
+
+    Each entry is a directory holding the numpy arrays (the index as
+    utc int64 nanoseconds, and the values) in `.npy` files and a json
+    metadata file. Entries are written in a temporary directory and
+    published with an atomic rename: concurrent writers of the same
+    entry are harmless (the first one wins).
+
+    Reads memory-map the arrays copy-on-write: their pages are shared
+    by all the readers of the host until modified, and the returned
+    series can be modified like any other (the changes stay private
+    to the process, the cache is not touched).
+
+    Entries are grouped by series name, so that all the entries of a
+    series can be invalidated. When `maxbytes` is given, the least
+    recently used entries are evicted beyond that size: the cache is
+    scanned once its size, as measured by the last scan plus the
+    writes of the process since, passes the limit (and every
+    `scan_every` writes, to account for the other writers). Only the
+    writes made through the process invalidate entries: those of a
+    series deleted or renamed by another process are served until
+    evicted (or `invalidate`d).
+    """
+
+    scan_every = 100
+
+    def __init__(self, path, maxbytes=None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.maxbytes = maxbytes
+        self._lock = threading.Lock()
+        # size estimate, and writes since the last scan
+        self._estimate = None
+        self._writes = 0
+
+    def __repr__(self):
+        return f'<DiskCache {self.path}>'
+
+    def _entry(self, name, key):
+        return self.path / _digest(name) / _digest(key)
+
+    def _read(self, name, key):
+        entry = self._entry(name, key)
+        try:
+            meta = json.loads((entry / 'meta.json').read_text())
+            arrays = {
+                aname: np.load(entry / f'{aname}.npy', mmap_mode='c')
+                for aname in meta['arrays']
+            }
+            # bump for the lru eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            # absent or being evicted
+            return None
+        return meta, arrays
+
+    def _write(self, name, key, meta, arrays):
+        entry = self._entry(name, key)
+        if entry.exists():
+            return
+        tmp = self.path / f'.tmp-{uuid.uuid4().hex}'
+        tmp.mkdir()
+        try:
+            entry.parent.mkdir(exist_ok=True)
+            for aname, array in arrays.items():
+                np.save(tmp / f'{aname}.npy', array)
+            meta['arrays'] = list(arrays)
+            (tmp / 'meta.json').write_text(json.dumps(meta))
+            nbytes = sum(f.stat().st_size for f in tmp.iterdir())
+            os.rename(tmp, entry)
+        except OSError:
+            # most likely published by someone else in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        if self.maxbytes:
+            self._written(nbytes)
+
+    def _written(self, nbytes):
+        # scan the cache only when it may have grown beyond the limit
+        with self._lock:
+            self._writes += 1
+            if self._estimate is not None:
+                self._estimate += nbytes
+            if (self._estimate is not None and
+                self._estimate <= self.maxbytes and
+                self._writes < self.scan_every):
+                return
+        self.evict(self.maxbytes)
+
+    def size(self):
+        return sum(
+            size for _, size, _ in self._entries()
+        )
+
+    def _entries(self):
+        for namedir in self.path.iterdir():
+            try:
+                if namedir.name.startswith('.tmp-'):
+                    # leftover of a dead writer
+                    if namedir.stat().st_mtime < time.time() - 3600:
+                        shutil.rmtree(namedir, ignore_errors=True)
+                    continue
+                for entry in namedir.iterdir():
+                    yield (
+                        entry.stat().st_mtime,
+                        sum(f.stat().st_size for f in entry.iterdir()),
+                        entry
+                    )
+            except FileNotFoundError:
+                continue
+
+    def invalidate(self, name):
+        shutil.rmtree(self.path / _digest(name), ignore_errors=True)
+
+    def evict(self, maxbytes=0):
+        """Drop the least recently used entries until the cache fits
+        in `maxbytes` (by default, empty it).
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= maxbytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        with self._lock:
+            self._estimate = total
+            self._writes = 0
+
+    # series
+
+    def getseries(self, name, key):
+        found = self._read(name, key)
+        if found is None:
+            return
+        meta, arrays = found
+        return pd.Series(
+            arrays['values'],
+            index=datetimeindex(arrays['index'], meta['tzaware']),
+            name=name
+        )
+
+    def putseries(self, name, key, series):
+        if not cacheable(series):
+            return
+        self._write(
+            name, key,
+            {
+                'tzaware': tzaware_serie(series)
+            },
+            {
+                'index': series.index.asi8,
+                'values': series.values
+            }
+        )
+
+    # history
+
+    def gethistory(self, name, key):
+        found = self._read(name, key)
+        if found is None:
+            return
+        meta, arrays = found
+        index = datetimeindex(arrays['index'], meta['tzaware'])
+        values = arrays['values']
+        offsets = arrays['offsets']
+        return {
+            pd.Timestamp(idate, tz='UTC'): pd.Series(
+                values[start:end],
+                index=index[start:end],
+                name=name
+            )
+            for idate, start, end in zip(
+                arrays['idates'], offsets[:-1], offsets[1:]
+            )
+        }
+
+    def puthistory(self, name, key, hist):
+        if not all(cacheable(series) for series in hist.values()):
+            return
+        series = list(hist.values())
+        tzaware = bool(series) and tzaware_serie(series[0])
+        self._write(
+            name, key,
+            {
+                'tzaware': tzaware
+            },
+            {
+                'idates': np.array(
+                    [idate.value for idate in hist], dtype='int64'
+                ),
+                'offsets': np.cumsum(
+                    [0] + [len(s) for s in series], dtype='int64'
+                ),
+                'index': np.concatenate(
+                    [s.index.asi8 for s in series]
+                ) if series else np.array([], dtype='int64'),
+                'values': np.concatenate(
+                    [s.values for s in series]
+                ) if series else np.array([], dtype='float64')
+            }
+        )
+
+
+def _digest(obj):
+    return hashlib.sha1(repr(obj).encode('utf-8')).hexdigest()
+
+
+def cacheable(series):
+    # string series are not worth the trouble
+    return (
+        isinstance(series.index, pd.DatetimeIndex) and
+        series.dtype != object
+    )
@@ -0,0 +1,410 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from tshistory_client.util import (
+    _staircases,
+    datetimeindex,
+    decodevalues,
+    iter_nary,
+    lastitems
+)
+
+
+def _utcvalue(dt):
+    # naive dates are taken as utc, as in the queries
+    dt = pd.Timestamp(dt)
+    if dt.tzinfo is None:
+        dt = dt.tz_localize('UTC')
+    return dt.value
+
+
+def _bound(dt, tzaware):
+    # a value date bound as nanoseconds, compared the way the server
+    # does (naive dates are utc, naive series drop the offset)
+    dt = pd.Timestamp(dt)
+    if dt.tzinfo is None:
+        dt = dt.tz_localize('UTC')
+    if not tzaware:
+        dt = dt.tz_localize(None)
+    return dt.value
+
+
+def _float(values):
+    # erased points are nans: numbers are stored as floats
+    values = np.asarray(values)
+    if values.dtype.kind in 'biu':
+        return values.astype('float64')
+    return values
+
+
+def _equal(a, b):
+    return (a == b) | (pd.isnull(a) & pd.isnull(b))
+
+
+def _diff(old, new):
+    # the diff of two revisions given as (value dates, values) sorted
+    # arrays: changed or new points, and erased points as nans
+    oldvd, oldvalues = old
+    newvd, newvalues = new
+    if not len(oldvd):
+        return new
+    pos = np.searchsorted(oldvd, newvd).clip(max=len(oldvd) - 1)
+    changed = ~(
+        (oldvd[pos] == newvd) & _equal(oldvalues[pos], newvalues)
+    )
+    if len(newvd):
+        pos = np.searchsorted(newvd, oldvd).clip(max=len(newvd) - 1)
+        erased = newvd[pos] != oldvd
+    else:
+        erased = np.ones(len(oldvd), dtype=bool)
+    if not erased.any():
+        return newvd[changed], newvalues[changed]
+    vdates = np.concatenate([newvd[changed], oldvd[erased]])
+    order = np.argsort(vdates, kind='stable')
+    values = np.concatenate([
+        newvalues[changed],
+        np.full(
+            erased.sum(),
+            None if newvalues.dtype == object else np.nan,
+            dtype=newvalues.dtype
+        )
+    ])
+    return vdates[order], values[order]
+
+
+def _patch(state, diff):
+    # apply a diff to a revision, both given as (value dates, values)
+    # sorted arrays, the erasures of the diff being nans
+    vdates, values = state
+    dvdates, dvalues = diff
+    if len(vdates):
+        kept = ~np.isin(vdates, dvdates, assume_unique=True)
+        vdates = np.concatenate([vdates[kept], dvdates])
+        values = np.concatenate([values[kept], dvalues])
+        order = np.argsort(vdates, kind='stable')
+        vdates, values = vdates[order], values[order]
+    else:
+        vdates, values = dvdates, dvalues
+    published = ~pd.isnull(values)
+    return vdates[published], values[published]
+
+
+class _builder:
+    # accumulates the revisions of a history as diffs, computing them
+    # on the fly from full revisions when `compact` is true
+
+    def __init__(self, compact):
+        self.compact = compact
+        self.previous = (np.empty(0, dtype='int64'), np.empty(0))
+        self.idates = []
+        self.vdates = []
+        self.values = []
+
+    def add(self, idate, vdates, values):
+        if self.compact:
+            new = vdates, values
+            vdates, values = _diff(self.previous, new)
+            self.previous = new
+        self.idates.append(idate)
+        self.vdates.append(vdates)
+        self.values.append(values)
+
+    def history(self, tzaware, dtype, name):
+        if not self.idates:
+            return History(
+                np.empty(0, dtype='int64'),
+                np.zeros(1, dtype='int64'),
+                np.empty(0, dtype='int64'),
+                np.empty(0, dtype=dtype),
+                tzaware,
+                name
+            )
+        offsets = np.zeros(len(self.idates) + 1, dtype='int64')
+        np.cumsum([len(vd) for vd in self.vdates], out=offsets[1:])
+        return History(
+            np.array(self.idates, dtype='int64'),
+            offsets,
+            np.concatenate(self.vdates),
+            np.concatenate(self.values).astype(dtype, copy=False),
+            tzaware,
+            name
+        )
+
+
+class History:
+    """Columnar history of a series.
+
+    The revisions are stored as diffs (nans standing for erased
+    points) in flat numpy arrays: `idates`, the insertion dates (utc
+    nanoseconds) of the revisions, `offsets`, the bounds of each
+    revision in the points arrays (revision i spans
+    `offsets[i]:offsets[i + 1]`), and the points `vdates` (value
+    dates, as nanoseconds) and `values`.
+
+    Lookups and revision analytics are computed over the whole
+    history at once, the points being sorted by value date and
+    insertion date.
+    """
+
+    def __init__(self, idates, offsets, vdates, values, tzaware, name=None):
+        self.idates = idates
+        self.offsets = offsets
+        self.vdates = vdates
+        self.values = values
+        self.tzaware = tzaware
+        self.name = name
+        self._sorted = None
+        self._latest = None
+
+    @classmethod
+    def fromdict(cls, hist, name=None, diffmode=False):
+        """Build from a {insertion date: series} dict, of revisions or
+        of diffs (`diffmode`), as returned by `Client.history`.
+        """
+        builder = _builder(compact=not diffmode)
+        tzaware, dtype = False, 'float64'
+        for idate, series in hist.items():
+            if not series.index.is_monotonic_increasing:
+                series = series.sort_index()
+            tzaware = getattr(series.index.dtype, 'tz', None) is not None
+            values = _float(series.values)
+            dtype = values.dtype
+            builder.add(_utcvalue(idate), series.index.asi8, values)
+        return builder.history(tzaware, dtype, name)
+
+    @classmethod
+    def fromchunks(cls, name, chunks, diffmode=False):
+        """Build from a history response body (a zlib compressed
+        `nary_pack` stream) given as an iterable of byte chunks.
+
+        The points are read from the decoded buffers without building
+        any series; full revisions are turned into diffs as they are
+        received.
+        """
+        items = iter_nary(chunks)
+        meta = json.loads(next(items).tobytes())
+        idates = next(items).view('<i8')
+        builder = _builder(compact=not diffmode)
+        dtype = 'object' if meta['value_type'] == 'object' else 'float64'
+        for idate, bindex, bvalues in zip(idates, items, items):
+            values = decodevalues(bvalues, meta)
+            if dtype == 'object':
+                values = np.array(values, dtype=object)
+            builder.add(int(idate), bindex.view('<i8'), _float(values))
+        return builder.history(meta['tzaware'], dtype, name)
+
+    def __len__(self):
+        return len(self.idates)
+
+    def __repr__(self):
+        return (
+            f'<History {self.name} {len(self)} revisions, '
+            f'{len(self.vdates)} points>'
+        )
+
+    @property
+    def nbytes(self):
+        return sum(
+            array.nbytes
+            for array in (self.idates, self.offsets, self.vdates, self.values)
+        )
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def insertion_dates(self):
+        return datetimeindex(self.idates, True)
+
+    def _series(self, vdates, values):
+        return pd.Series(
+            values,
+            index=datetimeindex(vdates, self.tzaware),
+            dtype=self.dtype,
+            name=self.name
+        )
+
+    def _points(self):
+        # (insertion dates, value dates, values) of all the points,
+        # by value date then insertion date
+        if self._sorted is None:
+            idates = np.repeat(self.idates, np.diff(self.offsets))
+            order = np.argsort(self.vdates, kind='stable')
+            self._sorted = (
+                idates[order], self.vdates[order], self.values[order]
+            )
+        return self._sorted
+
+    def _published(self):
+        # the points, erasures excluded
+        idates, vdates, values = self._points()
+        published = ~pd.isnull(values)
+        return idates[published], vdates[published], values[published]
+
+    def _statearrays(self, idate):
+        # the (value dates, values) of the state at an insertion date
+        idates, vdates, values = self._points()
+        if idate is not None:
+            known = idates <= idate
+            vdates, values = vdates[known], values[known]
+        last = lastitems(vdates)
+        vdates, values = vdates[last], values[last]
+        published = ~pd.isnull(values)
+        return vdates[published], values[published]
+
+    def _state(self, idate):
+        return self._series(*self._statearrays(idate))
+
+    def _diffarrays(self, rev):
+        start, end = self.offsets[rev], self.offsets[rev + 1]
+        return self.vdates[start:end], self.values[start:end]
+
+    def asof(self, revision_date=None):
+        """The state of the series at a revision date (by default,
+        the latest one).
+        """
+        if revision_date is not None:
+            return self._state(_utcvalue(revision_date))
+        if self._latest is None:
+            self._latest = self._state(None)
+        return self._latest.copy()
+
+    def first(self):
+        """The first published value of each value date."""
+        _, vdates, values = self._published()
+        first = np.ones(len(vdates), dtype=bool)
+        first[1:] = vdates[1:] != vdates[:-1]
+        return self._series(vdates[first], values[first])
+
+    def last(self):
+        """The last published value of each value date (erased ones
+        included).
+        """
+        _, vdates, values = self._published()
+        last = lastitems(vdates)
+        return self._series(vdates[last], values[last])
+
+    def count(self):
+        """The number of revisions of each value date (erasures
+        included).
+        """
+        _, vdates, _ = self._points()
+        vdates, counts = np.unique(vdates, return_counts=True)
+        return pd.Series(
+            counts,
+            index=datetimeindex(vdates, self.tzaware),
+            name=self.name
+        )
+
+    def deltas(self):
+        """The revision magnitudes: the change of each published
+        value from the previous one of its value date, indexed by
+        (value date, insertion date). First publications are left
+        out.
+        """
+        idates, vdates, values = self._published()
+        again = vdates[1:] == vdates[:-1]
+        index = pd.MultiIndex.from_arrays(
+            [
+                datetimeindex(vdates[1:][again], self.tzaware),
+                datetimeindex(idates[1:][again], True)
+            ],
+            names=['value_date', 'insertion_date']
+        )
+        return pd.Series(
+            (values[1:] - values[:-1])[again],
+            index=index,
+            name=self.name
+        )
+
+    def staircase(self, delta):
+        return self.staircases([delta])[delta]
+
+    def staircases(self, deltas):
+        """The staircase series of several deltas, as a {delta:
+        series} dict (see `util.staircases`).
+        """
+        return _staircases(
+            *self._points(), deltas, self.tzaware, self.dtype, self.name
+        )
+
+    def append(self, diffs):
+        """Return the history followed by the revisions of `diffs`, a
+        history of diffs from the next insertion date on (as given by
+        `Client.history(..., diffmode=True, _keep_nans=True,
+        columnar=True)`).
+        """
+        if not len(diffs):
+            return self
+        return History(
+            np.concatenate([self.idates, diffs.idates]),
+            np.concatenate([
+                self.offsets, diffs.offsets[1:] + self.offsets[-1]
+            ]),
+            np.concatenate([self.vdates, diffs.vdates]),
+            np.concatenate([self.values, diffs.values]),
+            self.tzaware,
+            self.name
+        )
+
+    def window(self, from_value_date=None, to_value_date=None):
+        """Return the history restricted to the value dates between
+        the bounds, keeping only the revisions touching them (as the
+        server does for a bounded `Client.history`).
+        """
+        if from_value_date is None and to_value_date is None:
+            return self
+        keep = np.ones(len(self.vdates), dtype=bool)
+        if from_value_date is not None:
+            keep &= self.vdates >= _bound(from_value_date, self.tzaware)
+        if to_value_date is not None:
+            keep &= self.vdates <= _bound(to_value_date, self.tzaware)
+        # points kept per revision
+        kept = np.concatenate([[0], np.cumsum(keep)])[self.offsets]
+        counts = np.diff(kept)
+        touched = counts > 0
+        return History(
+            self.idates[touched],
+            np.concatenate([[0], np.cumsum(counts[touched])]),
+            self.vdates[keep],
+            self.values[keep],
+            self.tzaware,
+            self.name
+        )
+
+    def to_dict(self, diffmode=False, _keep_nans=False,
+                from_insertion_date=None,
+                to_insertion_date=None):
+        """The {insertion date: series} dict of the revisions, or of
+        the diffs with `diffmode` (erasures being nans with
+        `_keep_nans`), as returned by `Client.history`.
+        """
+        first, last = 0, len(self.idates)
+        if from_insertion_date is not None:
+            first = np.searchsorted(
+                self.idates, _utcvalue(from_insertion_date)
+            )
+        if to_insertion_date is not None:
+            last = np.searchsorted(
+                self.idates, _utcvalue(to_insertion_date), side='right'
+            )
+        hist = {}
+        state = None
+        for rev in range(first, last):
+            idate = self.idates[rev]
+            if not diffmode:
+                # each state is the previous one patched with its diff
+                if state is None:
+                    state = self._statearrays(idate)
+                else:
+                    state = _patch(state, self._diffarrays(rev))
+                series = self._series(*state)
+            else:
+                series = self._series(*self._diffarrays(rev))
+                if not _keep_nans:
+                    series = series[series.notnull()]
+            hist[pd.Timestamp(idate, tz='UTC')] = series
+        return hist
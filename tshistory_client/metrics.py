@@ -0,0 +1,100 @@
+from bisect import bisect_left
+import threading
+
+
+# upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (
+    .001, .0025, .005, .01, .025, .05,
+    .1, .25, .5, 1, 2.5, 5, 10, float('inf')
+)
+
+
+class Metrics:
+    """Request events aggregator, to be used as a client listener.
+
+    It keeps per end point (e.g. 'GET /series/state') counters
+    (requests, errors, bytes sent and received on the wire and
+    uncompressed, cumulated http and decoding times) and a histogram
+    of the total request latencies (http plus decoding times) over
+    `buckets` (upper bounds, in seconds).
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def __repr__(self):
+        return f'<Metrics {len(self._endpoints)} end points>'
+
+    def __call__(self, event):
+        key = f"{event['method']} {event['endpoint']}"
+        latency = event['http_time'] + event['decode_time']
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = {
+                    'requests': 0,
+                    'errors': 0,
+                    'sent': 0,
+                    'received': 0,
+                    'sent_uncompressed': 0,
+                    'received_uncompressed': 0,
+                    'http_time': 0.,
+                    'decode_time': 0.,
+                    'histogram': [0] * len(self.buckets)
+                }
+            stats['requests'] += 1
+            if event['status'] is None or event['status'] >= 500:
+                stats['errors'] += 1
+            stats['sent'] += event['sent']
+            stats['received'] += event['received']
+            stats['sent_uncompressed'] += event['sent_uncompressed']
+            stats['received_uncompressed'] += event['received_uncompressed']
+            stats['http_time'] += event['http_time']
+            stats['decode_time'] += event['decode_time']
+            stats['histogram'][
+                min(bisect_left(self.buckets, latency), len(self.buckets) - 1)
+            ] += 1
+
+    def stats(self):
+        """Return the per end point counters, the histograms being
+        given as {bucket upper bound: count} dicts, with the achieved
+        compression ratios (uncompressed / wire bytes) of the sent
+        and received bodies.
+        """
+        with self._lock:
+            return {
+                key: dict(
+                    stats,
+                    histogram=dict(zip(self.buckets, stats['histogram'])),
+                    sent_ratio=_ratio(
+                        stats['sent_uncompressed'], stats['sent']
+                    ),
+                    received_ratio=_ratio(
+                        stats['received_uncompressed'], stats['received']
+                    )
+                )
+                for key, stats in self._endpoints.items()
+            }
+
+    def quantile(self, endpoint, q):
+        """Estimate a latency quantile of an end point, as the upper
+        bound of the histogram bucket where it falls.
+        """
+        with self._lock:
+            histogram = self._endpoints[endpoint]['histogram']
+            rank = q * sum(histogram)
+            seen = 0
+            for bound, count in zip(self.buckets, histogram):
+                seen += count
+                if count and seen >= rank:
+                    return bound
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def _ratio(uncompressed, wire):
+    return uncompressed / wire if wire else None
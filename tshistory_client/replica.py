@@ -0,0 +1,212 @@
+from fnmatch import fnmatch
+import threading
+import time
+
+import pandas as pd
+from tshistory.util import pruned_history
+
+from tshistory_client.history import History, _bound
+
+
+def _window(series, tzaware, from_value_date, to_value_date):
+    if from_value_date is None and to_value_date is None:
+        return series
+    index = series.index.asi8
+    keep = slice(
+        None if from_value_date is None else
+        index.searchsorted(_bound(from_value_date, tzaware)),
+        None if to_value_date is None else
+        index.searchsorted(_bound(to_value_date, tzaware), side='right')
+    )
+    return series.iloc[keep]
+
+
+class Replica:
+    """Local replica of a set of series, serving their `get`,
+    `staircase` and `history` reads.
+
+    The series are selected by `series`: a list of names, a name
+    pattern (e.g. 'banana_*') or a predicate over the names. Each one
+    is loaded on its first read as a columnar `History`, then kept up
+    to date by downloading the diffs of the revisions inserted since
+    the last one known (`history(..., from_insertion_date)`), at most
+    every `ttl` seconds (or on each read with 0, or only with `sync`
+    with None).
+
+    The writes made through the client are seen by the next read. A
+    series deleted and recreated by someone else is not noticed: it
+    must be reloaded with `sync(reload=True)`.
+    """
+
+    def __init__(self, client, series, ttl=60):
+        self.client = client
+        self.series = series
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # name -> (history, insertion date cursor, sync time)
+        self._replicas = {}
+        # name -> sync lock
+        self._synclocks = {}
+        self.reads = 0
+        self.loads = 0
+        self.syncs = 0
+
+    def __repr__(self):
+        return f'<Replica {len(self._replicas)} series>'
+
+    def __contains__(self, name):
+        if callable(self.series):
+            return bool(self.series(name))
+        if isinstance(self.series, str):
+            return fnmatch(name, self.series)
+        return name in self.series
+
+    def names(self):
+        """The selected names of the catalog."""
+        if not callable(self.series) and not isinstance(self.series, str):
+            return list(self.series)
+        return [
+            name
+            for items in self.client.catalog().values()
+            for name, _ in items
+            if name in self
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'series': len(self._replicas),
+                'points': sum(
+                    len(hist.vdates)
+                    for hist, _, _ in self._replicas.values()
+                    if hist is not None
+                ),
+                'reads': self.reads,
+                'loads': self.loads,
+                'syncs': self.syncs
+            }
+
+    def invalidate(self, name):
+        # sync at the next read
+        with self._lock:
+            known = self._replicas.get(name)
+            if known is not None:
+                self._replicas[name] = known[:2] + (None,)
+
+    def drop(self, name):
+        with self._lock:
+            self._replicas.pop(name, None)
+
+    def sync(self, names=None, reload=False):
+        """Bring the selected series (or the given ones) up to date,
+        loading those not held yet.
+        """
+        if reload:
+            for name in names or list(self._replicas):
+                self.drop(name)
+        for name in (self.names() if names is None else names):
+            self._sync(name)
+
+    def _synclock(self, name):
+        with self._lock:
+            return self._synclocks.setdefault(name, threading.Lock())
+
+    def _stale(self, known):
+        _, _, synced = known
+        return synced is None or (
+            self.ttl is not None and time.monotonic() - synced >= self.ttl
+        )
+
+    def _sync(self, name, force=True):
+        with self._synclock(name):
+            known = self._replicas.get(name)
+            if not force and known is not None and not self._stale(known):
+                # synced by someone else meanwhile
+                return known[0]
+            if known is not None and known[1] is not None:
+                hist, cursor, _ = known
+                diffs = self.client._columnarhistory(
+                    name,
+                    from_insertion_date=cursor,
+                    diffmode=True,
+                    _keep_nans=True
+                )
+                hist = None if diffs is None else hist.append(diffs)
+                counter = 'syncs'
+            else:
+                hist = self.client._columnarhistory(
+                    name,
+                    diffmode=True,
+                    _keep_nans=True
+                )
+                counter = 'loads'
+
+            cursor = None
+            if hist is not None and len(hist):
+                cursor = hist.insertion_dates[-1] + pd.Timedelta(
+                    microseconds=1
+                )
+            with self._lock:
+                setattr(self, counter, getattr(self, counter) + 1)
+                self._replicas[name] = (hist, cursor, time.monotonic())
+            return hist
+
+    def history_of(self, name):
+        """The up to date `History` of a series (None if unknown)."""
+        known = self._replicas.get(name)
+        if known is None or self._stale(known):
+            hist = self._sync(name, force=False)
+        else:
+            hist = known[0]
+        with self._lock:
+            self.reads += 1
+        return hist
+
+    # the client api
+
+    def get(self, name,
+            revision_date=None,
+            from_value_date=None,
+            to_value_date=None):
+        hist = self.history_of(name)
+        if hist is None:
+            return None
+        return _window(
+            hist.asof(revision_date),
+            hist.tzaware, from_value_date, to_value_date
+        )
+
+    def staircase(self, name, delta,
+                  from_value_date=None,
+                  to_value_date=None):
+        hist = self.history_of(name)
+        if hist is None:
+            return None
+        return _window(
+            hist.staircase(pd.Timedelta(delta)),
+            hist.tzaware, from_value_date, to_value_date
+        )
+
+    def history(self, name,
+                from_insertion_date=None,
+                to_insertion_date=None,
+                from_value_date=None,
+                to_value_date=None,
+                diffmode=False,
+                _keep_nans=False,
+                columnar=False):
+        hist = self.history_of(name)
+        if hist is None:
+            return None
+        bounded = from_value_date is not None or to_value_date is not None
+        revisions = hist.window(from_value_date, to_value_date).to_dict(
+            diffmode=diffmode,
+            _keep_nans=_keep_nans,
+            from_insertion_date=from_insertion_date,
+            to_insertion_date=to_insertion_date
+        )
+        if bounded:
+            revisions = pruned_history(revisions)
+        if columnar:
+            return History.fromdict(revisions, name, diffmode=diffmode)
+        return revisions
@@ -0,0 +1,130 @@
+import random
+import threading
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+
+# safe to replay: they read, or set a value
+IDEMPOTENT = {
+    ('GET', None),
+    ('PUT', '/series/metadata')
+}
+
+
+class RetryPolicy:
+    """Retry policy for the transient failures of a client.
+
+    The idempotent requests (reads, metadata settings) are retried on
+    connection errors, timeouts and the `statuses` answers. The other
+    ones (series writes, renamings, deletions, formula registrations)
+    are only retried when the server cannot have processed them: the
+    connection could not be established, or the answer is a 429 or
+    503.
+
+    Attempts are spaced by an exponential backoff with full jitter
+    (a random delay up to `backoff * 2 ** attempt`, capped at
+    `maxdelay` seconds), or by the Retry-After delay of the server.
+
+    The retry budget bounds the retries to a `budget` ratio of the
+    requests, beyond a reserve of `minretries` (a token bucket
+    replenished by each request), so that an outage does not turn
+    into a retry storm.
+    """
+
+    def __init__(self,
+                 retries=3,
+                 backoff=.1,
+                 maxdelay=10,
+                 statuses=(429, 500, 502, 503, 504),
+                 budget=.2,
+                 minretries=10):
+        self.retries = retries
+        self.backoff = backoff
+        self.maxdelay = maxdelay
+        self.statuses = frozenset(statuses)
+        self.budget = budget
+        self.minretries = minretries
+        self._lock = threading.Lock()
+        self._tokens = float(minretries)
+        self.requests = 0
+        self.retried = 0
+        self.exhausted = 0
+        self.byendpoint = {}
+
+    def __repr__(self):
+        return f'<RetryPolicy {self.retries} retries>'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retried,
+                'budget_exhausted': self.exhausted,
+                'endpoints': dict(self.byendpoint)
+            }
+
+    def started(self):
+        # a new request earns a share of a retry
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(
+                self._tokens + self.budget,
+                max(self.minretries, 1)
+            )
+
+    def idempotent(self, method, path):
+        return (
+            (method, None) in IDEMPOTENT or
+            (method, path) in IDEMPOTENT
+        )
+
+    def retryable(self, method, path, error=None, status=None):
+        if self.idempotent(method.upper(), path):
+            if error is not None:
+                return isinstance(
+                    error, (requests.ConnectionError, requests.Timeout)
+                )
+            return status in self.statuses
+        if error is not None:
+            return _notsent(error)
+        return status in (429, 503)
+
+    def allows(self, method, path, attempt, error=None, status=None):
+        """Tell if a failed attempt (counted from 0) is to be retried,
+        and if so, account for it.
+        """
+        if attempt >= self.retries:
+            return False
+        if not self.retryable(method, path, error=error, status=status):
+            return False
+        with self._lock:
+            if self._tokens < 1:
+                self.exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retried += 1
+            key = f'{method.upper()} {path}'
+            self.byendpoint[key] = self.byendpoint.get(key, 0) + 1
+        return True
+
+    def delay(self, attempt, retryafter=None):
+        if retryafter is not None:
+            try:
+                return min(float(retryafter), self.maxdelay)
+            except ValueError:
+                pass  # an http date: let's not bother
+        return random.uniform(
+            0, min(self.backoff * 2 ** attempt, self.maxdelay)
+        )
+
+
+def _notsent(error):
+    # the request cannot have reached the server
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        reason = error.args[0] if error.args else None
+        reason = getattr(reason, 'reason', reason)
+        return isinstance(reason, NewConnectionError)
+    return False
@@ -0,0 +1,218 @@
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+def datetimeindex(i8values, tzaware):
+    """Build a DatetimeIndex over an int64 (utc nanoseconds) numpy
+    array, without copying it.
+    """
+    if tzaware:
+        return pd.DatetimeIndex(
+            i8values, dtype='datetime64[ns, UTC]', copy=False
+        )
+    return pd.DatetimeIndex(
+        i8values.view('datetime64[ns]'), copy=False
+    )
+
+
+def _inflate(chunks, maxsize):
+    # decompress a stream of chunks in pieces of at most maxsize bytes
+    # (the input is fed by small slices, because the unconsumed tail
+    # of the input is a copy)
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        chunk = memoryview(chunk)
+        for pos in range(0, len(chunk), 1 << 16):
+            data = chunk[pos:pos + (1 << 16)]
+            while data:
+                yield decompressor.decompress(data, maxsize)
+                data = decompressor.unconsumed_tail
+    yield decompressor.flush()
+
+
+class _reader:
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.current = memoryview(b'')
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer)
+        pos = 0
+        while pos < len(buffer):
+            if not len(self.current):
+                try:
+                    self.current = memoryview(next(self.pieces))
+                except StopIteration:
+                    raise ValueError('truncated nary stream')
+            size = min(len(buffer) - pos, len(self.current))
+            buffer[pos:pos + size] = self.current[:size]
+            self.current = self.current[size:]
+            pos += size
+        return buffer
+
+
+def iter_nary(chunks, maxsize=1 << 20):
+    """Iterate over the items of a zlib compressed `nary_pack` stream
+    given as an iterable of byte chunks.
+
+    Each item is yielded as soon as it is complete, as a fresh numpy
+    uint8 buffer: the decompressed data is never held in full and
+    only `maxsize` bytes are inflated at a time.
+    """
+    reader = _reader(_inflate(chunks, maxsize))
+    [count] = struct.unpack('!L', reader.readinto(bytearray(4)))
+    sizes = struct.unpack(
+        f'!{count}L', reader.readinto(bytearray(4 * count))
+    )
+    for size in sizes:
+        buffer = np.empty(size, dtype=np.uint8)
+        reader.readinto(buffer)
+        yield buffer
+
+
+def frombuffers(bindex, bvalues, meta):
+    """Build a series over the index and values numpy uint8 buffers
+    (as serialized by `tshistory.util.numpy_serialize`).
+    """
+    index = datetimeindex(bindex.view('<i8'), meta['tzaware'])
+    return pd.Series(
+        decodevalues(bvalues, meta),
+        index=index,
+        dtype=meta['value_type']
+    )
+
+
+def decodevalues(bvalues, meta):
+    """Decode a values numpy uint8 buffer, as a view for numeric
+    values and as a list for strings (None standing for nan).
+    """
+    if meta['value_type'] == 'object':  # str
+        return [
+            v.decode('utf-8') if v != b'\3' else None
+            for v in bvalues.tobytes().split(b'\0')
+        ] if len(bvalues) else []
+    return bvalues.view(meta['value_dtype'])
+
+
+def _numeric(series):
+    return series.dtype.kind in 'fiu'
+
+
+def alignframe(seriesdict):
+    """Align the series of a {name: series} dict in a dataframe.
+
+    The union of the indexes is computed once and the (numeric)
+    values are written into a preallocated 2d array: unlike
+    `pd.concat(axis=1)`, no intermediate realigned copy of the
+    columns is made. Non-numeric series are aligned with
+    `pd.concat`.
+
+    Mixing tz-aware and naive series is a ValueError.
+    """
+    if not seriesdict:
+        return pd.DataFrame()
+    names = list(seriesdict)
+    columns = list(seriesdict.values())
+    tzaware = [
+        getattr(s.index.dtype, 'tz', None) is not None
+        for s in columns
+    ]
+    if any(tzaware) and not all(tzaware):
+        raise ValueError(
+            'cannot align tz-aware and naive series: ' + ', '.join(
+                f'{name} ({"tz-aware" if aware else "naive"})'
+                for name, aware in zip(names, tzaware)
+            )
+        )
+    if not all(
+            _numeric(s) and
+            isinstance(s.index, pd.DatetimeIndex) and
+            str(s.index.dtype).startswith('datetime64[ns') and
+            s.index.is_monotonic_increasing and
+            s.index.is_unique
+            for s in columns):
+        return pd.concat(seriesdict, axis=1)
+
+    # the indexes being sorted, their union is a linear merge
+    index = columns[0].index
+    for series in columns[1:]:
+        if not index.equals(series.index):
+            index = index.union(series.index)
+    union = index.asi8
+
+    # one row per column, so that the frame can adopt it as is
+    values = np.full((len(columns), len(union)), np.nan)
+    for row, series in zip(values, columns):
+        if series.index is index or len(series) == len(union):
+            row[:] = series.values
+        else:
+            row[np.searchsorted(union, series.index.asi8)] = series.values
+    return pd.DataFrame(
+        values.T,
+        index=index,
+        columns=names,
+        copy=False
+    )
+
+
+def staircases(hist, deltas, name=None):
+    """Compute the staircase series of several deltas from a history
+    of diffs (as given by `history(diffmode=True, _keep_nans=True)`).
+
+    The value of a staircase at a value date is the one known `delta`
+    before it, that is from the last diff inserted at least `delta`
+    before the value date and touching it (a nan meaning erased).
+    The history is flattened and sorted by value date once, then each
+    delta is a mask and a pick of the last item per value date.
+    """
+    series = list(hist.values())
+    if not series:
+        return {
+            delta: pd.Series(dtype='float64', name=name)
+            for delta in deltas
+        }
+    first = series[0]
+    idates = np.repeat(
+        np.array([idate.value for idate in hist], dtype='int64'),
+        [len(s) for s in series]
+    )
+    vdates = np.concatenate([s.index.asi8 for s in series])
+    values = np.concatenate([s.values for s in series])
+    # by value date, then insertion date
+    order = np.argsort(vdates, kind='stable')
+    return _staircases(
+        idates[order], vdates[order], values[order], deltas,
+        getattr(first.index.dtype, 'tz', None) is not None,
+        first.dtype,
+        name
+    )
+
+
+def lastitems(vdates):
+    """Mask of the last items of each value date over sorted value
+    dates.
+    """
+    last = np.ones(len(vdates), dtype=bool)
+    last[:-1] = vdates[1:] != vdates[:-1]
+    return last
+
+
+def _staircases(idates, vdates, values, deltas, tzaware, dtype, name):
+    # the flat arrays are sorted by value date, then insertion date
+    result = {}
+    for delta in deltas:
+        known = idates <= vdates - pd.Timedelta(delta).value
+        vd = vdates[known]
+        last = lastitems(vd)
+        stair = pd.Series(
+            values[known][last],
+            index=datetimeindex(vd[last], tzaware),
+            dtype=dtype,
+            name=name
+        )
+        result[delta] = stair[stair.notnull()]
+    return result